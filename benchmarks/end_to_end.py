@@ -0,0 +1,187 @@
+# Benchmark de bout en bout du CodeScraper réel, dans Chrome headless, contre le
+# serveur de rejeu (aucun accès réseau) : temps par phase, temps par code
+# révélé, nombre de commandes WebDriver et pic de mémoire. Le code de sortie est
+# non nul si les codes obtenus ne sont pas ceux servis, pour l'utiliser en CI.
+#
+# python -m benchmarks.end_to_end --cards 30 --latency 0.05 --runs 3
+# python -m benchmarks.end_to_end --fixtures fixtures/site --json results.json
+import argparse
+import functools
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from statistics import median
+
+import psutil
+
+from benchmarks.page_load import BENCHMARK_OPTIONS
+from benchmarks.replay import Fixtures, ReplayServer, replay_code
+from benchmarks.webdriver_commands import count_commands
+from scrape.driver import init_driver
+from scrape.driver_pool import driver_memory_mb
+from scrape.ratelimit import RateLimiter
+from scrape.scraper import CodeScraper
+
+
+class PhaseTimer:
+    # cumule la durée des appels aux méthodes instrumentées, par phase
+    def __init__(self):
+        self.durations = Counter()
+        self.calls = Counter()
+
+    def wrap(self, obj, name: str, phase: str) -> None:
+        method = getattr(obj, name)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.durations[phase] += time.perf_counter() - start
+                self.calls[phase] += 1
+
+        setattr(obj, name, timed)
+
+
+class MemorySampler:
+    # pic de mémoire résidente de Chrome (chromedriver compris) et de Python
+    def __init__(self, driver, interval: float = 0.05):
+        self.driver = driver
+        self.interval = interval
+        self.peak_browser_mb = 0.0
+        self.peak_python_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self) -> None:
+        process = psutil.Process()
+        while not self._stop.is_set():
+            self.peak_browser_mb = max(
+                self.peak_browser_mb, driver_memory_mb(self.driver)
+            )
+            self.peak_python_mb = max(
+                self.peak_python_mb, process.memory_info().rss / 2**20
+            )
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "MemorySampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def run_once(url: str, n_cards: int, args: argparse.Namespace) -> dict:
+    timer = PhaseTimer()
+    start = time.perf_counter()
+    driver = init_driver(options=BENCHMARK_OPTIONS, profile=args.profile)
+    timer.durations["driver_start"] = time.perf_counter() - start
+    try:
+        commands = count_commands(driver)
+        scraper = CodeScraper(
+            driver,
+            url,
+            use_http=args.use_http,
+            reveal_mode=args.reveal_mode,
+            # le limiteur ne doit pas fausser la mesure du scraper
+            rate_limiter=RateLimiter(
+                initial_rate=args.rate, max_rate=args.rate, burst=args.rate
+            ),
+        )
+        timer.wrap(driver, "get", "page_load")
+        timer.wrap(scraper, "scrape_fields", "fields")
+        timer.wrap(scraper, "reveal_code", "reveal")
+
+        with MemorySampler(driver) as memory:
+            start = time.perf_counter()
+            result = scraper.scrape()
+            scrape_time = time.perf_counter() - start
+    finally:
+        driver.quit()
+
+    phases = dict(timer.durations)
+    phases["other"] = scrape_time - sum(
+        phases.get(phase, 0.0) for phase in ("page_load", "fields", "reveal")
+    )
+    codes = [] if result is None else list(result.codes["code"])
+    n_revealed = timer.calls["reveal"]
+    return {
+        "wall_time": phases["driver_start"] + scrape_time,
+        "phases": phases,
+        "revealed": n_revealed,
+        "time_per_code": phases.get("reveal", 0.0) / n_revealed if n_revealed else 0,
+        "webdriver_commands": sum(commands.values()),
+        "top_commands": dict(commands.most_common(5)),
+        "peak_browser_mb": memory.peak_browser_mb,
+        "peak_python_mb": memory.peak_python_mb,
+        "codes_ok": sorted(codes) == sorted(replay_code(i) for i in range(n_cards)),
+    }
+
+
+def summarize(runs: list[dict]) -> dict:
+    return {
+        "runs": len(runs),
+        "wall_time": median([run["wall_time"] for run in runs]),
+        "phases": {
+            phase: median([run["phases"].get(phase, 0.0) for run in runs])
+            for phase in runs[0]["phases"]
+        },
+        "time_per_code": median([run["time_per_code"] for run in runs]),
+        "webdriver_commands": median([run["webdriver_commands"] for run in runs]),
+        "peak_browser_mb": max(run["peak_browser_mb"] for run in runs),
+        "peak_python_mb": max(run["peak_python_mb"] for run in runs),
+        "codes_ok": all(run["codes_ok"] for run in runs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=None)
+    parser.add_argument("--cards", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--voucher-latency", type=float, default=0.0)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--profile", default="default")
+    parser.add_argument("--reveal-mode", default="click")
+    parser.add_argument("--use-http", action="store_true")
+    parser.add_argument("--rate", type=float, default=1000.0)
+    parser.add_argument("--json", default=None)
+    args = parser.parse_args()
+
+    fixtures = Fixtures.load(args.fixtures) if args.fixtures else Fixtures()
+    with ReplayServer(
+        fixtures,
+        n_cards=args.cards,
+        latency=args.latency,
+        voucher_latency=args.voucher_latency,
+    ) as server:
+        runs = [run_once(server.url, args.cards, args) for _ in range(args.runs)]
+    summary = summarize(runs)
+
+    print(
+        f"{args.cards} card(s), {summary['runs']} run(s) (median): "
+        f"{summary['wall_time']:.2f} s wall time, "
+        f"{summary['time_per_code'] * 1000:.0f} ms per revealed code, "
+        f"{summary['webdriver_commands']:.0f} WebDriver command(s)"
+    )
+    for phase, duration in summary["phases"].items():
+        print(f"  {phase:<15} {duration:8.2f} s")
+    print(
+        f"Peak RSS: {summary['peak_browser_mb']:.0f} MB (Chrome), "
+        f"{summary['peak_python_mb']:.0f} MB (Python)"
+    )
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"summary": summary, "runs": runs}, file, indent=2)
+    if not summary["codes_ok"]:
+        sys.exit("Scraped codes do not match the replayed codes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Compare la conversion des champs des cartes valeur par valeur (format_exp_date,
+# split de la réduction) et colonne par colonne (scrape.normalize).
+#
+# python -m benchmarks.normalize --cards 100000
+import argparse
+import random
+import time
+
+from scrape.normalize import MONTHS_FR, parse_discounts, parse_expiration_dates
+from scrape.scraper import format_exp_date
+
+
+def synthetic_cards(n_cards: int, seed: int = 0) -> tuple[list[str], list[str]]:
+    rng = random.Random(seed)
+    months = list(MONTHS_FR)
+    discounts, dates = [], []
+    for _ in range(n_cards):
+        discounts.append(f"{rng.randint(1, 80)}%\nde réduction")
+        draw = rng.random()
+        if draw < 0.05:
+            dates.append("Expire aujourd'hui")
+        elif draw < 0.1:
+            dates.append("Expire demain")
+        else:
+            dates.append(f"Expire le : {rng.randint(1, 28)} {rng.choice(months)}")
+    return discounts, dates
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=100_000)
+    args = parser.parse_args()
+
+    discounts, dates = synthetic_cards(args.cards)
+
+    per_value = timed(
+        lambda: (
+            [int(value.split("%\n")[0]) for value in discounts],
+            [format_exp_date(value) for value in dates],
+        )
+    )
+    vectorized = timed(
+        lambda: (parse_discounts(discounts), parse_expiration_dates(dates))
+    )
+
+    assert parse_expiration_dates(dates).tolist() == list(map(format_exp_date, dates))
+
+    print(f"per value: {per_value * 1000:.0f} ms for {args.cards} card(s)")
+    print(f"vectorized: {vectorized * 1000:.0f} ms for {args.cards} card(s)")
+
+
+if __name__ == "__main__":
+    main()
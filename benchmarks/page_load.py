@@ -0,0 +1,96 @@
+# Compare le temps de chargement et le volume téléchargé d'une page entre les
+# profils de navigateur "default" et "lean", à partir d'un serveur local.
+#
+# python -m benchmarks.page_load --images 40 --runs 5
+import argparse
+import functools
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from scrape.driver import init_driver
+
+BENCHMARK_OPTIONS = ("--headless=new", "--no-sandbox", "window-size=1920,1080")
+
+
+def write_fixture(directory: str, n_images: int) -> None:
+    # fichiers factices de tailles réalistes : seul le volume compte
+    for i in range(n_images):
+        with open(os.path.join(directory, f"image_{i}.png"), "wb") as file:
+            file.write(os.urandom(50_000))
+    with open(os.path.join(directory, "font.woff2"), "wb") as file:
+        file.write(os.urandom(80_000))
+    with open(os.path.join(directory, "analytics.js"), "w") as file:
+        file.write("var x = 0;\n" * 20_000)
+
+    images = "".join(f'<img src="image_{i}.png">' for i in range(n_images))
+    with open(os.path.join(directory, "index.html"), "w") as file:
+        file.write(
+            '<html><head><meta charset="utf-8">'
+            "<style>@font-face {font-family: f; src: url(font.woff2);}"
+            " body {font-family: f;}</style>"
+            '<script src="analytics.js"></script></head>'
+            f'<body><div data-testid="active-vouchers-widget">{images}</div>'
+            "</body></html>"
+        )
+
+
+def serve(directory: str) -> ThreadingHTTPServer:
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=directory)
+    handler.log_message = lambda *args: None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def downloaded_bytes(driver) -> int:
+    total = 0
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        if message["method"] == "Network.loadingFinished":
+            total += message["params"]["encodedDataLength"]
+    return total
+
+
+def measure(url: str, profile: str, runs: int) -> tuple[float, float]:
+    timings, sizes = [], []
+    for _ in range(runs):
+        # un navigateur neuf par mesure pour ne pas profiter du cache
+        driver = init_driver(
+            options=BENCHMARK_OPTIONS, performance_log=True, profile=profile
+        )
+        try:
+            driver.get_log("performance")
+            start = time.perf_counter()
+            driver.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            sizes.append(downloaded_bytes(driver))
+        finally:
+            driver.quit()
+    return statistics.median(timings), statistics.median(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_fixture(directory, args.images)
+        server = serve(directory)
+        url = f"http://127.0.0.1:{server.server_port}/index.html"
+        try:
+            for profile in ("default", "lean"):
+                ms, size = measure(url, profile, args.runs)
+                print(f"{profile}: {ms:.0f} ms, {size / 1024:.0f} KiB per page")
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+# Rejoue hors ligne une page marchand de Radins.com : bannière cookies, cartes,
+# boîte de dialogue du premier code, onglets "voir le code" et fermeture de la
+# popup. Les fixtures sont synthétiques par défaut, ou enregistrées sur le site
+# réel avec la commande record.
+#
+# python -m benchmarks.replay record https://www.radins.com/... fixtures/site
+# python -m benchmarks.replay serve --fixtures fixtures/site --cards 50
+import argparse
+import datetime
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from scrape.scraper import CARD_CSS_SELECTOR, CSS_SELECTORS
+
+# comportement du site réel, réimplémenté pour les pages rejouées : le premier
+# clic ouvre une boîte de dialogue, les suivants ouvrent directement un nouvel
+# onglet avec la popup du code, et l'onglet d'origine part vers le marchand
+BEHAVIOUR_SCRIPT = """
+<script>
+(function () {
+  var first = !new URLSearchParams(location.search).has("voucher");
+  function reveal(i) {
+    window.open("/?voucher=" + i);
+    location.href = "/outbound";
+  }
+  document.addEventListener("click", function (event) {
+    var target = event.target;
+    if (target.closest("#cmpwelcomebtnno")) {
+      (target.closest("#cmpbox") || target).remove();
+      return;
+    }
+    if (target.closest('span[data-testid="CloseIcon"]')) {
+      document.getElementById("replay-popup").remove();
+      return;
+    }
+    var dialogButton = target.closest("#replay-dialog div[role=button]");
+    if (dialogButton) {
+      reveal(dialogButton.dataset.card);
+      return;
+    }
+    var button = target.closest(
+      'div[data-testid="description-container"] div[role="button"]'
+    );
+    if (!button) {
+      return;
+    }
+    var cards = Array.from(document.querySelectorAll(CARD_SELECTOR));
+    var i = cards.indexOf(button.closest(CARD_SELECTOR));
+    if (first) {
+      first = false;
+      document.body.insertAdjacentHTML(
+        "beforeend",
+        '<div id="replay-dialog" role="dialog">' +
+          '<div role="button" data-card="' + i + '">Voir le code</div></div>'
+      );
+    } else {
+      reveal(i);
+    }
+  }, true);
+})();
+</script>
+""".replace("CARD_SELECTOR", json.dumps(CARD_CSS_SELECTOR))
+
+SYNTHETIC_PAGE = """<html><head><meta charset="utf-8"><title>Replay</title></head>
+<body>
+<div id="cmpbox"><a id="cmpwelcomebtnno" href="#">Refuser</a></div>
+<div data-testid="header-widget"><h1>Codes promo Replay valides en ce moment</h1></div>
+<div data-testid="Codes-button">Codes</div>
+<div data-testid="active-vouchers-widget">{{cards}}</div>
+{{popup}}
+</body></html>
+"""
+
+SYNTHETIC_CARD = """
+<div data-testid="voucher-card-container">
+  <div>
+    <div data-testid="voucher-card-captions">{{discount}}%<br>de réduction</div>
+    <div>
+      <div data-testid="description-container">
+        <h3>Code promo n°{{i}}</h3>
+        <div role="button">Voir le code</div>
+      </div>
+      <div>Expire le : 12 déc.</div>
+    </div>
+  </div>
+</div>
+"""
+
+SYNTHETIC_POPUP = """
+<div role="dialog">
+  <span data-testid="voucherPopup-codeHolder-voucherType-code"><h4>{{code}}</h4></span>
+  <span data-testid="CloseIcon">×</span>
+</div>
+"""
+
+OUTBOUND_PAGE = "<html><body>Site du marchand</body></html>"
+
+SCRIPT_PATTERN = re.compile(r"<script\b.*?</script>", re.DOTALL | re.IGNORECASE)
+
+
+@dataclass
+class Fixtures:
+    # page : {{cards}} à la place des cartes, {{popup}} à la place de la popup
+    # card : {{i}} (position) et éventuellement {{discount}}
+    # popup : {{code}} à la place du code
+    page: str = SYNTHETIC_PAGE
+    card: str = SYNTHETIC_CARD
+    popup: str = SYNTHETIC_POPUP
+
+    @classmethod
+    def load(cls, directory: str) -> "Fixtures":
+        templates = {}
+        for name in ("page", "card", "popup"):
+            with open(os.path.join(directory, f"{name}.html")) as file:
+                templates[name] = file.read()
+        return cls(**templates)
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for name in ("page", "card", "popup"):
+            with open(os.path.join(directory, f"{name}.html"), "w") as file:
+                file.write(getattr(self, name))
+
+    def render(self, n_cards: int, voucher: int | None = None) -> str:
+        cards = "".join(
+            self.card.replace("{{i}}", str(i)).replace("{{discount}}", str(5 + i % 50))
+            for i in range(n_cards)
+        )
+        popup = ""
+        if voucher is not None:
+            popup = '<div id="replay-popup">{}</div>'.format(
+                self.popup.replace("{{code}}", replay_code(voucher))
+            )
+        page = self.page.replace("{{cards}}", cards).replace("{{popup}}", popup)
+        return page.replace("</body>", f"{BEHAVIOUR_SCRIPT}</body>")
+
+
+def replay_code(i: int) -> str:
+    return f"REPLAY{i:04d}"
+
+
+class ReplayServer:
+    def __init__(
+        self,
+        fixtures: Fixtures | None = None,
+        n_cards: int = 20,
+        latency: float = 0.0,
+        voucher_latency: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        # latency : délai de chaque réponse ; voucher_latency : délai ajouté aux
+        # pages ouvertes par "voir le code"
+        self.fixtures = fixtures or Fixtures()
+        self.n_cards = n_cards
+        self.latency = latency
+        self.voucher_latency = voucher_latency
+        self.requests = 0
+        self.server = ThreadingHTTPServer((host, port), self.create_handler())
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def create_handler(self) -> type[BaseHTTPRequestHandler]:
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                replay.requests += 1
+                parsed = urlparse(self.path)
+                voucher = parse_qs(parsed.query).get("voucher")
+                time.sleep(replay.latency + (replay.voucher_latency if voucher else 0))
+                if parsed.path == "/":
+                    body = replay.fixtures.render(
+                        replay.n_cards, int(voucher[0]) if voucher else None
+                    )
+                elif parsed.path == "/outbound":
+                    body = OUTBOUND_PAGE
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "ReplayServer":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "ReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+# enregistrement sur le site réel
+CARD_TEMPLATE_SCRIPT = """
+const cards = document.querySelectorAll(arguments[0]);
+const card = cards[0].outerHTML;
+const widget = cards[0].parentElement;
+widget.innerHTML = "{{cards}}";
+return card;
+"""
+
+POPUP_TEMPLATE_SCRIPT = """
+const holder = document.querySelector(arguments[0]);
+const popup = holder.closest('[role="dialog"]') || holder.parentElement;
+return popup.outerHTML;
+"""
+
+
+def record(url: str, directory: str, options: list | tuple) -> None:
+    from scrape.driver import init_driver
+    from scrape.scraper import CodeScraper
+
+    driver = init_driver(options=options)
+    try:
+        driver.get(url)
+        scraper = CodeScraper(driver, url)
+        # champs de la première carte, pour les remplacer par des variables
+        scraper.scrape_fields()
+        description = scraper.data["description"][0]
+
+        # la page (bannière cookies comprise) sans ses scripts, cartes remplacées
+        card = driver.execute_script(CARD_TEMPLATE_SCRIPT, CARD_CSS_SELECTOR)
+        page = SCRIPT_PATTERN.sub("", driver.page_source)
+        page = page.replace("</body>", "{{popup}}</body>")
+        card = card.replace(description, f"{description} n°{{{{i}}}}", 1)
+
+        # popup du code, obtenue en révélant le premier code comme le scraper.
+        # reveal_code la referme : l'URL de l'onglet du code la rouvre
+        driver.get(url)
+        click_cookies_and_codes(driver)
+        code = scraper.reveal_code(0, first=True)
+        driver.get(driver.current_url)
+        popup = driver.execute_script(POPUP_TEMPLATE_SCRIPT, CSS_SELECTORS["code"])
+        popup = SCRIPT_PATTERN.sub("", popup).replace(code, "{{code}}")
+    finally:
+        driver.quit()
+
+    Fixtures(page=page, card=card, popup=popup).save(directory)
+    with open(os.path.join(directory, "meta.json"), "w") as file:
+        json.dump(
+            {"url": url, "recorded_at": datetime.datetime.now().isoformat()}, file
+        )
+
+
+def click_cookies_and_codes(driver) -> None:
+    from selenium.common.exceptions import TimeoutException
+
+    from scrape.driver import click_element
+
+    for name in ("reject_cookies", "display_codes_only"):
+        try:
+            click_element(driver, CSS_SELECTORS[name])
+        except TimeoutException:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record")
+    record_parser.add_argument("url")
+    record_parser.add_argument("directory")
+    serve_parser = commands.add_parser("serve")
+    serve_parser.add_argument("--fixtures", default=None)
+    serve_parser.add_argument("--cards", type=int, default=20)
+    serve_parser.add_argument("--latency", type=float, default=0.0)
+    serve_parser.add_argument("--voucher-latency", type=float, default=0.0)
+    serve_parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.url, args.directory, options=("--headless=new", "--no-sandbox"))
+        print(f"Fixtures saved to {args.directory!r}.")
+        return
+
+    fixtures = Fixtures.load(args.fixtures) if args.fixtures else Fixtures()
+    server = ReplayServer(
+        fixtures,
+        n_cards=args.cards,
+        latency=args.latency,
+        voucher_latency=args.voucher_latency,
+        port=args.port,
+    )
+    print(f"Serving {args.cards} card(s) on {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
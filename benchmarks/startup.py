@@ -0,0 +1,58 @@
+# Mesure le temps d'import de chaque module au démarrage (python -X importtime),
+# pour repérer les imports lourds qui ralentissent les démarrages à froid.
+#
+# python -m benchmarks.startup --module main --top 15 --budget-ms 500
+import argparse
+import subprocess
+import sys
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    # module -> (temps propre, temps cumulé) en microsecondes
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def top_level(times: dict[str, tuple[int, int]]) -> dict[str, int]:
+    # somme des temps propres par paquet racine (pandas, selenium, google...)
+    packages = {}
+    for name, (self_us, _) in times.items():
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    total_ms = times[args.module][1] / 1000
+    packages = sorted(top_level(times).items(), key=lambda item: -item[1])
+
+    print(f"import {args.module}: {total_ms:.1f} ms ({len(times)} modules)")
+    for package, self_us in packages[: args.top]:
+        print(f"  {package:<30} {self_us / 1000:8.1f} ms")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        sys.exit(f"Startup budget exceeded: {total_ms:.1f} > {args.budget_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
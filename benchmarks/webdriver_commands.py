@@ -0,0 +1,96 @@
+# Compte les commandes WebDriver nécessaires pour lire les champs des cartes,
+# élément par élément (get_element_texts) ou en un seul execute_script
+# (get_card_texts), sur une page synthétique.
+#
+# python -m benchmarks.webdriver_commands --cards 50
+import argparse
+import base64
+import time
+from collections import Counter
+
+from scrape.driver import get_card_texts, get_element_texts, init_driver
+from scrape.scraper import (
+    CARD_CSS_SELECTOR,
+    CARD_FIELD_CSS_SELECTORS,
+    FIELD_CSS_SELECTORS,
+)
+
+CARD_HTML = """
+<div data-testid="voucher-card-container">
+  <div>
+    <div data-testid="voucher-card-captions">{discount}%<br>de réduction</div>
+    <div>
+      <div data-testid="description-container">
+        <h3>Code promo n°{i}</h3>
+        <div role="button">Voir le code</div>
+      </div>
+      <div>Expire le : 12 déc.</div>
+    </div>
+  </div>
+</div>
+"""
+
+
+def build_page(n_cards: int) -> str:
+    cards = "".join(
+        CARD_HTML.format(i=i, discount=5 + i % 50) for i in range(n_cards)
+    )
+    return (
+        '<html><head><meta charset="utf-8"></head><body>'
+        f'<div data-testid="active-vouchers-widget">{cards}</div>'
+        "</body></html>"
+    )
+
+
+def count_commands(driver) -> Counter:
+    counter = Counter()
+    execute = driver.execute
+
+    def counting_execute(driver_command, params=None):
+        counter[driver_command] += 1
+        return execute(driver_command, params)
+
+    driver.execute = counting_execute
+    return counter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=50)
+    args = parser.parse_args()
+
+    driver = init_driver(options=("--headless=new", "--no-sandbox"))
+    try:
+        page = base64.b64encode(build_page(args.cards).encode()).decode()
+        driver.get(f"data:text/html;charset=utf-8;base64,{page}")
+        counter = count_commands(driver)
+
+        for name, extract in (
+            (
+                "get_element_texts",
+                lambda: [
+                    get_element_texts(driver, css_selector)
+                    for css_selector in FIELD_CSS_SELECTORS.values()
+                ],
+            ),
+            (
+                "get_card_texts",
+                lambda: get_card_texts(
+                    driver, CARD_CSS_SELECTOR, CARD_FIELD_CSS_SELECTORS
+                ),
+            ),
+        ):
+            counter.clear()
+            start = time.perf_counter()
+            extract()
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name}: {sum(counter.values())} WebDriver command(s), "
+                f"{elapsed * 1000:.1f} ms for {args.cards} card(s)"
+            )
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,507 @@
-import datetime
+from __future__ import annotations
 
-from google.cloud import exceptions
+import asyncio
+import dataclasses
+import datetime
+import os
+import sys
+from typing import TYPE_CHECKING
 
-from scrape.alert import create_alert, send_mail
-from scrape.codes import select_new_codes
+from scrape.codes import known_codes_from_previous, select_new_codes
 from scrape.config import (
-    load_browser_options,
+    GoogleCloudConfig,
+    ScrapeConfig,
+    load_browser_config,
     load_scrape_config_from_storage,
     read_cloud_config,
 )
-from scrape.driver import init_driver
-from scrape.html import df_to_html
-from scrape.queries import download_previous_codes, last_execution, upload_scrape_result
-from scrape.scraper import CodeScraper
-from scrape.secrets import get_secret_string
+from scrape import tracing
+from scrape.lazy import lazy_import
+from scrape.queries import (
+    BatchUploader,
+    SnapshotCache,
+    create_snapshot_cache,
+    create_snapshot_store,
+    fingerprint_index,
+    last_execution,
+    latest_execution_and_codes,
+)
+from scrape.sharding import TASK_COUNT_ENV, Shard, ShardResults, merge_tables
 
+# selenium, pandas et les clients d'emails ne sont importés qu'une fois établi
+# qu'il y a des sites à scraper : un démarrage à froid qui s'arrête tôt reste
+# rapide
+if TYPE_CHECKING:
+    import pandas as pd
 
-def main():
-    # importe les paramètres de configuration des services Google Cloud
-    cloud_config = read_cloud_config("./cloud_config.json")
+    from scrape.config import BrowserConfig
+    from scrape.pool import ScrapePool
+    from scrape.scraper import ScrapeResult
+
+exceptions = lazy_import("google.cloud.exceptions")
+
+
+@tracing.traced("load_known_fingerprints")
+def load_known_fingerprints(
+    url: str, cloud_config: GoogleCloudConfig, cache: SnapshotCache | None = None
+) -> set[str]:
+    print(f"Attempting to retrieve known codes for {url!r}...")
+    try:
+        known_fingerprints = fingerprint_index(
+            url=url, bigquery_config=cloud_config.bigquery, cache=cache
+        )
+        print("Done.")
+    except exceptions.NotFound:
+        print("No previous codes found.")
+        known_fingerprints = set()
+    return known_fingerprints
 
-    # télécharge et importe les paramètres de configuration du script
-    scrape_config = load_scrape_config_from_storage(cloud_config.storage)
 
-    # vérifie que le script n'a pas déjà été exécuté aujourd'hui
-    last_exec_date = last_execution(
-        url=scrape_config.url, bigquery_config=cloud_config.bigquery
+def find_new_codes(
+    result: ScrapeResult,
+    scrape_config: ScrapeConfig,
+    cloud_config: GoogleCloudConfig,
+    cache: SnapshotCache | None = None,
+    known_fingerprints: set[str] | None = None,
+) -> pd.DataFrame:
+    # recherche les codes jamais vus pour ce site, sur tout l'historique
+    if known_fingerprints is None:
+        known_fingerprints = load_known_fingerprints(result.url, cloud_config, cache)
+    return select_new_codes(
+        current_codes=result.codes,
+        previous_codes=known_fingerprints,
+        threshold=scrape_config.min_discount,
     )
-    today = datetime.date.today()
-    if last_exec_date == today:
-        print(f"Script was already executed today ({today}). Ending script.")
-        return
 
-    options = load_browser_options(cloud_config.storage)
-    driver = init_driver(options=options)
 
-    # scrape les codes promo
-    scraper = CodeScraper(driver, scrape_config.url)
-    result = scraper.scrape()
-    scraper.close_driver()
-    if result is None:
-        print("No codes found.")
-        return
+@tracing.traced("previous_run")
+def previous_run(
+    url: str,
+    scrape_config: ScrapeConfig,
+    cloud_config: GoogleCloudConfig,
+    cache: SnapshotCache | None = None,
+) -> tuple[datetime.date | None, dict[str, str] | None]:
+    # date de dernière exécution pour le site et, en mode incrémental, codes déjà
+    # révélés (récupérés dans la même requête)
+    if not scrape_config.incremental:
+        last_exec_date = last_execution(
+            url=url, bigquery_config=cloud_config.bigquery, cache=cache
+        )
+        return last_exec_date, None
+    try:
+        last_exec_date, codes = latest_execution_and_codes(
+            url=url, bigquery_config=cloud_config.bigquery, cache=cache
+        )
+    except exceptions.NotFound:
+        return None, None
+    return last_exec_date, known_codes_from_previous(codes)
+
+
+def email_credentials(cloud_config: GoogleCloudConfig) -> tuple[str, str]:
+    from scrape.secrets import get_secret_strings
 
-    # récupère les anciens codes et recherche les codes originaux
-    print("Attempting to retrieve previous codes...")
     try:
-        previous_codes = download_previous_codes(
-            url=scrape_config.url, bigquery_config=cloud_config.bigquery
+        secrets = get_secret_strings(
+            ("EMAIL_USER", "EMAIL_PASS"), cloud_config.storage.project_id
         )
-        new_codes = select_new_codes(
-            current_codes=result.codes,
-            previous_codes=previous_codes,
-            threshold=scrape_config.min_discount,
+        return secrets["EMAIL_USER"], secrets["EMAIL_PASS"]
+    except NameError:
+        print("Email user or password not found.")
+        raise
+
+
+def alert_tables(
+    results: list[ScrapeResult], new_codes: dict[str, pd.DataFrame]
+) -> dict[str, tuple[str, pd.DataFrame, pd.Index]]:
+    # une table par site ayant de nouveaux codes, avec les lignes à surligner
+    tables = {}
+    for result in results:
+        if result.url not in new_codes:
+            continue
+        if new_codes[result.url].empty:
+            print(f"No new codes found for {result.website_name}. No alert sent.")
+            continue
+        tables[result.url] = (
+            result.website_name,
+            result.codes_human_readable,
+            new_codes[result.url].index,
         )
-        print("Done.")
-    except exceptions.NotFound:
-        print("No previous codes found.")
-        new_codes = result.codes
+    return tables
 
-    # sauvegarde les codes actifs dans la BDD
-    print("Uploading scraping data...")
-    upload_scrape_result(result, bigquery_config=cloud_config.bigquery)
-    print("Done.")
 
+@tracing.traced("send_alerts")
+def send_alerts(
+    results: list[ScrapeResult],
+    new_codes: dict[str, pd.DataFrame],
+    scrape_config: ScrapeConfig,
+    cloud_config: GoogleCloudConfig,
+    credentials: tuple[str, str] | None = None,
+) -> None:
     # envoie une alerte email ou non selon les paramètres de configuration
     if not scrape_config.send_alert:
         print("Alerts are turned off.")
-    else:
-        if new_codes.empty:
-            print("No new codes found. No alert sent.")
-        else:
+        return
+    send_digests(
+        alert_tables(results, new_codes), scrape_config, cloud_config, credentials
+    )
+
+
+def send_digests(
+    tables: dict[str, tuple[str, pd.DataFrame, pd.Index]],
+    scrape_config: ScrapeConfig,
+    cloud_config: GoogleCloudConfig,
+    credentials: tuple[str, str | None] | None = None,
+) -> None:
+    # credentials : (expéditeur, mot de passe), le mot de passe à None pour un
+    # serveur sans authentification
+    if not tables:
+        return
+
+    from scrape.alert import Mailer, create_digest
+
+    user, password = credentials or email_credentials(cloud_config)
+
+    # un seul email par abonné, regroupant tous ses sites
+    subscribers = scrape_config.subscribers or {user: list(tables)}
+    alerts = []
+    for receiver, urls in subscribers.items():
+        sections = [tables[url] for url in urls if url in tables]
+        if sections:
+            alerts.append(
+                create_digest(sender=user, receiver=receiver, sections=sections)
+            )
+
+    # une seule connexion SMTP pour tous les envois
+    with Mailer(
+        sender=user,
+        password=password,
+        host=scrape_config.smtp_host,
+        port=scrape_config.smtp_port,
+        use_ssl=scrape_config.smtp_ssl,
+    ) as mailer:
+        for alert in alerts:
             try:
-                user = get_secret_string("EMAIL_USER", cloud_config.storage.project_id)
-                password = get_secret_string(
-                    "EMAIL_PASS", cloud_config.storage.project_id
+                mailer.send(alert)
+                print(f"Alert sent to {alert['To']!r}.")
+            except Exception as e:
+                print(f"Alert failed for {alert['To']!r}: {e!r}")
+
+
+def shard_results(shard: Shard, cloud_config: GoogleCloudConfig) -> ShardResults:
+    store = create_snapshot_store(cloud_config.shards, cloud_config.storage)
+    if store is None:
+        raise ValueError("Sharded runs need a 'shards' store in cloud_config.json.")
+    return ShardResults(store, shard)
+
+
+@tracing.traced("publish_shard")
+def publish_shard(
+    shard: Shard,
+    urls: list[str],
+    results: list[ScrapeResult],
+    new_codes: dict[str, pd.DataFrame],
+    scrape_config: ScrapeConfig,
+    cloud_config: GoogleCloudConfig,
+    credentials: tuple[str, str] | None = None,
+    complete: bool = True,
+) -> None:
+    # chaque tâche publie ses résultats ; la dernière à terminer les fusionne et
+    # envoie un seul email par abonné pour tous les sites. Une tâche dont des
+    # sites ont échoué (complete=False) attend d'être relancée
+    tables = {}
+    if scrape_config.send_alert:
+        tables = alert_tables(results, new_codes)
+    store = shard_results(shard, cloud_config)
+    missing = [url for url in urls if url not in new_codes]
+    store.save(urls, tables, missing, complete=complete)
+    print(f"Shard {shard.index} results saved.")
+    if not complete:
+        print("Some sites failed. The retried task will merge the results.")
+        return
+    shards = store.load_all()
+    if shards is None:
+        print("Other shards still running. The last one will send the alerts.")
+    elif store.claim_merge():
+        merge_shards(shards, scrape_config, cloud_config, credentials)
+    else:
+        print("Another shard finished at the same time and sends the alerts.")
+
+
+@tracing.traced("merge_shards")
+def merge_shards(
+    shards: list[dict],
+    scrape_config: ScrapeConfig,
+    cloud_config: GoogleCloudConfig,
+    credentials: tuple[str, str] | None = None,
+) -> None:
+    tables = merge_tables(shards)
+    n_sites = sum(len(shard["urls"]) for shard in shards)
+    missing = [url for shard in shards for url in shard["missing"]]
+    print(
+        f"Merged {len(shards)} shard(s): {n_sites} site(s) scraped, "
+        f"{len(tables)} with new codes, {len(missing)} without results."
+    )
+    for url in missing:
+        print(f"  No results for {url!r}.")
+    if not scrape_config.send_alert:
+        print("Alerts are turned off.")
+        return
+    send_digests(tables, scrape_config, cloud_config, credentials)
+
+
+def merge_only(execution: str | None = None, count: str | None = None) -> None:
+    # fusion manuelle des résultats disponibles, par exemple quand une tâche a
+    # échoué définitivement et qu'aucune n'a donc envoyé les alertes. Les
+    # résultats sont rangés par exécution et par nombre de tâches : le nom de
+    # l'exécution est passé en argument (celle de la fusion est différente), le
+    # nombre de tâches aussi ou lu dans l'environnement du job
+    count = count or os.environ.get(TASK_COUNT_ENV)
+    if not execution or count is None or int(count) < 2:
+        raise ValueError(
+            "Usage: `python main.py merge <execution> <count>`, with at least 2 "
+            f"shards (the count can also be set in {TASK_COUNT_ENV})."
+        )
+    cloud_config = read_cloud_config("./cloud_config.json")
+    scrape_config = load_scrape_config_from_storage(cloud_config.storage)
+    shard = Shard(index=0, count=int(count), execution=execution)
+    store = shard_results(shard, cloud_config)
+    shards = store.load_all(partial=True)
+    if not shards:
+        print(f"No shard results found for {execution!r} ({count} shards).")
+    elif store.claim_merge():
+        merge_shards(shards, scrape_config, cloud_config)
+    else:
+        print(f"Shard results of {execution!r} were already merged.")
+
+
+@tracing.traced("upload_results")
+def upload_results(
+    results: list[ScrapeResult],
+    cloud_config: GoogleCloudConfig,
+    cache: SnapshotCache | None = None,
+) -> None:
+    # sauvegarde les codes actifs de tous les sites dans la BDD en une fois
+    print("Uploading scraping data...")
+    uploader = BatchUploader(cloud_config.bigquery, cache=cache)
+    for result in results:
+        uploader.add(result)
+    uploader.flush()
+    print("Done.")
+
+
+def create_scrape_pool(
+    scrape_config: ScrapeConfig,
+    browser_config: BrowserConfig,
+    cloud_config: GoogleCloudConfig,
+) -> ScrapePool:
+    from scrape.pool import ScrapePool
+
+    return ScrapePool(
+        scrape_config.urls,
+        options=browser_config.options,
+        n_workers=scrape_config.n_workers,
+        use_http=scrape_config.use_http,
+        reveal_mode=scrape_config.reveal_mode,
+        export_dir=scrape_config.export_dir,
+        driver_max_uses=scrape_config.driver_max_uses,
+        driver_max_memory_mb=scrape_config.driver_max_memory_mb,
+        profile=browser_config.profile,
+        checkpoint_config=cloud_config.checkpoint,
+        storage_config=cloud_config.storage,
+    )
+
+
+async def gather_checks(
+    scrape_config: ScrapeConfig,
+    cloud_config: GoogleCloudConfig,
+    cache: SnapshotCache | None,
+) -> tuple[list[str], dict[str, dict[str, str]]]:
+    # vérifie que le script n'a pas déjà été exécuté aujourd'hui pour chaque
+    # site. En mode incrémental, seules les cartes inconnues seront révélées
+    today = datetime.date.today()
+    checks = await asyncio.gather(
+        *(
+            asyncio.to_thread(previous_run, url, scrape_config, cloud_config, cache)
+            for url in scrape_config.urls
+        )
+    )
+    urls = []
+    known_codes = {}
+    for url, (last_exec_date, codes) in zip(scrape_config.urls, checks):
+        if last_exec_date == today:
+            print(f"Script was already executed today ({today}) for {url!r}.")
+            continue
+        urls.append(url)
+        if codes is not None:
+            known_codes[url] = codes
+    return urls, known_codes
+
+
+async def orchestrate() -> None:
+    # les étapes indépendantes se recouvrent : Chrome démarre pendant la
+    # vérification des dernières exécutions, les codes connus et les secrets
+    # sont récupérés pendant le scraping, l'upload et l'envoi des alertes se font
+    # en même temps. Les bibliothèques bloquantes tournent dans des threads.
+    cloud_config = read_cloud_config("./cloud_config.json")
+    scrape_config, browser_config = await asyncio.gather(
+        asyncio.to_thread(load_scrape_config_from_storage, cloud_config.storage),
+        asyncio.to_thread(load_browser_config, cloud_config.storage),
+    )
+    # exécution répartie (job Cloud Run à plusieurs tâches) : chaque tâche ne
+    # scrape que ses sites, et les tâches écrivent en même temps dans la table
+    # des codes et le cache
+    shard = Shard.from_env()
+    cache = create_snapshot_cache(
+        cloud_config.snapshot_cache,
+        cloud_config.storage,
+        exclusive=not shard.enabled,
+    )
+    if shard.enabled:
+        scrape_config = dataclasses.replace(
+            scrape_config, url=shard.select(scrape_config.urls)
+        )
+        print(
+            f"Shard {shard.index} of {shard.count}: "
+            f"{len(scrape_config.urls)} site(s)."
+        )
+
+    checks = asyncio.create_task(gather_checks(scrape_config, cloud_config, cache))
+    pool = await asyncio.to_thread(
+        create_scrape_pool, scrape_config, browser_config, cloud_config
+    )
+    # les navigateurs sont attendus sans occuper de thread : sinon asyncio.run
+    # attendrait leur démarrage avant de rendre la main, même sans site à scraper
+    warm_up = asyncio.gather(
+        *map(asyncio.wrap_future, await asyncio.to_thread(pool.start_warm_up))
+    )
+    try:
+        urls, known_codes = await checks
+        if not urls:
+            # les navigateurs en cours de démarrage ne serviront pas
+            print("Nothing to scrape. Ending script.")
+            warm_up.cancel()
+            pool.close(cancel=True)
+            if shard.enabled:
+                await asyncio.to_thread(
+                    publish_shard, shard, [], [], {}, scrape_config, cloud_config
                 )
+            return
 
-            except NameError:
-                print("Email user or password not found.")
-                raise
+        fingerprints = {
+            url: asyncio.create_task(
+                asyncio.to_thread(load_known_fingerprints, url, cloud_config, cache)
+            )
+            for url in urls
+        }
+        credentials = None
+        if scrape_config.send_alert:
+            credentials = asyncio.create_task(
+                asyncio.to_thread(email_credentials, cloud_config)
+            )
+
+        try:
+            await warm_up
+        except Exception as e:
+            # chaque worker relancera son navigateur au premier site
+            print(f"Browser warm-up failed: {e!r}")
+        results = await asyncio.to_thread(pool.scrape, urls, known_codes)
+    except BaseException:
+        warm_up.cancel()
+        pool.close(cancel=True)
+        raise
+    await asyncio.to_thread(pool.close)
+    failed = pool.failed
+    if not results:
+        print("No codes found.")
+        if shard.enabled:
+            await asyncio.to_thread(
+                publish_shard,
+                shard,
+                urls,
+                [],
+                {},
+                scrape_config,
+                cloud_config,
+                complete=not failed,
+            )
+        raise_for_failures(failed)
+        return
+
+    known_fingerprints = dict(
+        zip(
+            fingerprints,
+            await asyncio.gather(*fingerprints.values(), return_exceptions=True),
+        )
+    )
+    new_codes = {}
+    for result in results:
+        try:
+            if isinstance(known_fingerprints[result.url], Exception):
+                raise known_fingerprints[result.url]
+            new_codes[result.url] = find_new_codes(
+                result,
+                scrape_config,
+                cloud_config,
+                cache,
+                known_fingerprints=known_fingerprints[result.url],
+            )
+        except Exception as e:
+            # un site en échec ne doit pas bloquer les autres
+            print(f"New code detection failed for {result.url!r}: {e!r}")
 
-            df_html = df_to_html(result.codes_human_readable, new_codes.index)
-            alert = create_alert(
-                sender=user,
-                receiver=user,
-                website=result.website_name,
-                table=df_html,
+    async def alert() -> None:
+        user_password = None
+        if credentials is not None:
+            try:
+                user_password = await credentials
+            except Exception:
+                # nouvel essai (et message d'erreur) dans send_alerts si besoin
+                pass
+        if shard.enabled:
+            await asyncio.to_thread(
+                publish_shard,
+                shard,
+                urls,
+                results,
+                new_codes,
+                scrape_config,
+                cloud_config,
+                user_password,
+                complete=not failed,
             )
-            send_mail(sender=user, password=password, receiver=user, message=alert)
-            print(f"Alert sent to {user!r}.")
+            return
+        await asyncio.to_thread(
+            send_alerts, results, new_codes, scrape_config, cloud_config, user_password
+        )
+
+    outcomes = await asyncio.gather(
+        asyncio.to_thread(upload_results, results, cloud_config, cache),
+        alert(),
+        return_exceptions=True,
+    )
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+    raise_for_failures(failed)
+
+
+def raise_for_failures(failed: list[str]) -> None:
+    # code de sortie non nul : Cloud Run relance la tâche, qui reprend les sites
+    # en échec depuis leur point de reprise (les autres sont déjà à jour)
+    if failed:
+        raise RuntimeError(
+            f"Scraping failed for {len(failed)} site(s): {', '.join(failed)}."
+        )
+
+
+def main():
+    with tracing.span("main"):
+        # python main.py merge <execution> [<count>] : fusion des résultats
+        # d'une exécution répartie sur <count> tâches
+        if sys.argv[1:2] == ["merge"]:
+            merge_only(*sys.argv[2:4])
+        else:
+            asyncio.run(orchestrate())
 
 
 if __name__ == "__main__":
@@ -1,6 +1,12 @@
 import smtplib
 import ssl
 from email.message import EmailMessage
+from typing import Hashable, Iterable, Optional
+
+import pandas as pd
+
+from . import tracing
+from .html import df_to_html, dfs_to_html
 
 
 def create_alert(
@@ -26,6 +32,107 @@ def create_alert(
     return message
 
 
+def create_digest(
+    sender: str,
+    receiver: str,
+    sections: Iterable[tuple[str, pd.DataFrame, Optional[Iterable[Hashable]]]],
+) -> EmailMessage:
+    # une alerte regroupant plusieurs sites : (nom du site, table, index des
+    # nouveaux codes)
+    sections = list(sections)
+    if len(sections) == 1:
+        website, table, new_code_idxs = sections[0]
+        return create_alert(
+            sender, receiver, website, df_to_html(table, new_code_idxs)
+        )
+
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = receiver
+    message["Subject"] = "[Alerte codes promo] Nouveaux codes"
+
+    websites = ", ".join(website for website, _, _ in sections)
+    tables = dfs_to_html(sections)
+    body = f"""\
+    <html>
+        <body>
+            <p>De nouveaux codes promo ont été ajoutés pour les sites {websites}.
+            </p>
+            {tables}
+        </body>
+    </html>
+    """
+
+    message.set_content(body, subtype="html")
+
+    return message
+
+
+class Mailer:
+    # garde une connexion SMTP authentifiée ouverte pour tous les envois de
+    # l'exécution et se reconnecte si elle est coupée
+    def __init__(
+        self,
+        sender: str,
+        password: Optional[str],
+        host: str = "smtp.gmail.com",
+        port: int = 465,
+        use_ssl: bool = True,
+        max_retries: int = 1,
+    ):
+        self.sender = sender
+        self.password = password
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.max_retries = max_retries
+        self._smtp: Optional[smtplib.SMTP] = None
+
+    def connect(self) -> smtplib.SMTP:
+        if self._smtp is None:
+            if self.use_ssl:
+                context = ssl.create_default_context()
+                smtp = smtplib.SMTP_SSL(self.host, self.port, context=context)
+            else:
+                # serveur local (tests)
+                smtp = smtplib.SMTP(self.host, self.port)
+            if self.password is not None:
+                smtp.login(self.sender, self.password)
+            self._smtp = smtp
+        return self._smtp
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+
+    @tracing.traced("smtp.send")
+    def send(self, message: EmailMessage) -> None:
+        receivers = message.get_all("To", [])
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.connect().sendmail(self.sender, receivers, message.as_string())
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._smtp = None
+                if attempt == self.max_retries:
+                    raise
+
+    def send_many(self, messages: Iterable[EmailMessage]) -> None:
+        for message in messages:
+            self.send(message)
+
+    def __enter__(self) -> "Mailer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+@tracing.traced("send_mail")
 def send_mail(
     sender: str, password: str, receiver: str, message: EmailMessage
 ) -> None:
@@ -0,0 +1,58 @@
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional
+
+from . import constants
+
+_MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, ttl: float = constants.CACHE_TTL):
+        self.ttl = ttl
+        self._data: dict[Hashable, tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None, max_age: Optional[float] = None):
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            item = self._data.get(key)
+        if item is None or time.monotonic() - item[0] > max_age:
+            return default
+        return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# clients Google Cloud partagés par tout le processus (un par service et projet)
+_clients: dict[Hashable, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(key: Hashable, factory: Callable[[], Any]) -> Any:
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = factory()
+        return _clients[key]
+
+
+def reset_shared_clients() -> None:
+    # dans un processus enfant : les clients éventuellement hérités du parent
+    # (et leurs connexions HTTP) ne doivent pas être réutilisés, le parent
+    # continue de s'en servir
+    global _clients_lock
+    _clients_lock = threading.Lock()
+    _clients.clear()
@@ -0,0 +1,51 @@
+import datetime
+import json
+from collections import Counter
+from typing import Optional
+
+from .utils import generate_hash_key_md5
+
+
+def card_keys(fingerprints: list[str]) -> list[str]:
+    # les cartes identiques (même empreinte) sont distinguées par leur rang
+    # parmi elles, pour que chacune retrouve son propre code
+    seen = Counter()
+    keys = []
+    for fingerprint in fingerprints:
+        keys.append(f"{fingerprint}:{seen[fingerprint]}")
+        seen[fingerprint] += 1
+    return keys
+
+
+class RevealCheckpoint:
+    # codes déjà révélés pour un site lors de l'exécution du jour, enregistrés
+    # après chaque code : un scraping interrompu (plantage de Chrome, timeout)
+    # reprend à la première carte non révélée
+    def __init__(self, store, url: str, today: Optional[datetime.date] = None):
+        # store : LocalSnapshotStore ou GCSSnapshotStore
+        self.store = store
+        self.name = f"{generate_hash_key_md5(url)}.checkpoint.json"
+        self.today = (today or datetime.date.today()).isoformat()
+        self.entries: dict[str, dict] = {}
+
+    def load(self) -> dict[str, str]:
+        # clé de carte (card_keys) -> code ; un point de reprise d'un autre jour
+        # est ignoré
+        try:
+            data = json.loads(self.store.read_bytes(self.name))
+        except (FileNotFoundError, ValueError):
+            data = {}
+        if data.get("date") == self.today:
+            self.entries = data["codes"]
+        else:
+            self.entries = {}
+        return {key: entry["code"] for key, entry in self.entries.items()}
+
+    def save(self, key: str, code: str, position: int) -> None:
+        self.entries[key] = {"code": code, "position": position}
+        data = {"date": self.today, "codes": self.entries}
+        self.store.write_bytes(self.name, json.dumps(data).encode())
+
+    def clear(self) -> None:
+        self.entries = {}
+        self.store.delete(self.name)
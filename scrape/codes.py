@@ -1,8 +1,14 @@
+from __future__ import annotations
+
 import datetime
+from collections import Counter
 from typing import Iterable
 
-import pandas as pd
-from google.cloud import bigquery, exceptions
+from .lazy import lazy_import
+from .normalize import days_until
+from .utils import generate_hash_key_md5
+
+pd = lazy_import("pandas")
 
 COL_NAMES = {
     "discount": "Réduction (%)",
@@ -15,18 +21,75 @@ COL_NAMES = {
 
 def select_new_codes(
     current_codes: pd.DataFrame,
-    previous_codes: pd.DataFrame,
+    previous_codes: pd.DataFrame | set[str],
     discount_col: str = "discount",
     threshold: int = 0,
 ) -> pd.DataFrame:
-    df = pd.merge(
-        left=current_codes, right=previous_codes, how="left", indicator=True
+    # previous_codes : anciens codes, ou ensemble des empreintes (code_fingerprint)
+    # de tous les codes déjà vus pour ce site
+    if isinstance(previous_codes, pd.DataFrame):
+        known = set(code_fingerprints(previous_codes))
+    else:
+        known = previous_codes
+    is_new = pd.Series(
+        [fingerprint not in known for fingerprint in code_fingerprints(current_codes)],
+        index=current_codes.index,
+        dtype=bool,
+    )
+    return current_codes.loc[is_new & (current_codes[discount_col] >= threshold)]
+
+
+def card_fingerprint(discount, description: str, expiration_date) -> str:
+    # identifie une carte à partir des champs visibles avant de révéler le code
+    description = " ".join(str(description).split()).casefold()
+    if pd.isna(expiration_date):
+        expiration_date = ""
+    else:
+        expiration_date = pd.Timestamp(expiration_date).date().isoformat()
+    return generate_hash_key_md5(f"{int(discount)}|{description}|{expiration_date}")
+
+
+def card_fingerprints(data: pd.DataFrame | dict[str, list]) -> list[str]:
+    return [
+        card_fingerprint(*card)
+        for card in zip(
+            data["discount"], data["description"], data["expiration_date"]
+        )
+    ]
+
+
+def code_fingerprint(code: str, discount, description: str, expiration_date) -> str:
+    # identifie un code de façon stable d'une exécution à l'autre
+    code = " ".join(str(code).split()).casefold()
+    return generate_hash_key_md5(
+        f"{code}|{card_fingerprint(discount, description, expiration_date)}"
     )
-    df = df.loc[
-        (df["_merge"] == "left_only") & (df[discount_col] >= threshold)
-    ].drop(columns="_merge")
 
-    return df
+
+def code_fingerprints(data: pd.DataFrame) -> list[str]:
+    return [
+        code_fingerprint(*code)
+        for code in zip(
+            data["code"],
+            data["discount"],
+            data["description"],
+            data["expiration_date"],
+        )
+    ]
+
+
+def known_codes_from_previous(previous_codes: pd.DataFrame) -> dict[str, str]:
+    if previous_codes.empty:
+        return {}
+    # les cartes identiques (même réduction, description et date d'expiration)
+    # ne peuvent pas être distinguées : leurs codes ne sont pas réutilisés
+    fingerprints = card_fingerprints(previous_codes)
+    counts = Counter(fingerprints)
+    return {
+        fingerprint: code
+        for fingerprint, code in zip(fingerprints, previous_codes["code"])
+        if counts[fingerprint] == 1
+    }
 
 
 def days_from_today(date: datetime.date):
@@ -38,7 +101,7 @@ def add_days_before_exp(
     exp_date_col: str = "expiration_date",
 ) -> pd.DataFrame:
     data = data.copy()
-    data["days_before_exp"] = data[exp_date_col].map(days_from_today)
+    data["days_before_exp"] = days_until(data[exp_date_col])
     return data
 
 
@@ -1,46 +1,88 @@
+from __future__ import annotations
+
+import copy
+import datetime
 import json
+import math
 from dataclasses import dataclass, field
+from typing import Optional
+
+from .cache import TTLCache, shared_client
+from .lazy import lazy_import
 
-from google.cloud import bigquery, storage
+# les bibliothèques Google ne sont chargées qu'à la première utilisation d'un
+# client, pour un démarrage rapide
+bigquery = lazy_import("google.cloud.bigquery")
+storage = lazy_import("google.cloud.storage")
 
 
 @dataclass
 class StorageConfig:
     project_id: str
-    client: storage.Client = field(init=False)
     bucket_name: str
     scrape_config_path: str
     browser_options_path: str
 
-    def __post_init__(self):
-        self.client = storage.Client(project=self.project_id)
+    @property
+    def client(self) -> storage.Client:
+        # client créé au premier accès puis partagé par tout le processus
+        return shared_client(
+            ("storage", self.project_id),
+            lambda: storage.Client(project=self.project_id),
+        )
 
 
 @dataclass
 class BigQueryConfig:
     project_id: str
-    client: bigquery.Client = field(init=False)
     dataset_id: str
     _code_table: dict
     _website_table: dict
     create_table_if_needed: bool = False
+    use_storage_api: bool = True
+    _client: Optional[bigquery.Client] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
-    def __post_init__(self):
-        self.client = bigquery.Client(project=self.project_id)
+    @property
+    def client(self) -> bigquery.Client:
+        if self._client is not None:
+            return self._client
+        return shared_client(
+            ("bigquery", self.project_id),
+            lambda: bigquery.Client(project=self.project_id),
+        )
+
+    def with_client(self, client: bigquery.Client) -> BigQueryConfig:
+        # copie de la configuration utilisant le client donné (ex. un faux
+        # client dans les tests) au lieu du client partagé
+        config = copy.copy(self)
+        config._client = client
+        return config
 
     @property
     def code_table(self) -> bigquery.Table:
-        table_id = self._code_table["table_id"]
-        table_ref = f"{self.project_id}.{self.dataset_id}.{table_id}"
-        schema = self.create_schema(self._code_table["fields"])
-        return bigquery.Table(table_ref, schema)
+        return self.create_table(self._code_table)
 
     @property
     def website_table(self) -> bigquery.Table:
-        table_id = self._website_table["table_id"]
+        return self.create_table(self._website_table)
+
+    def create_table(self, table_config: dict) -> bigquery.Table:
+        table_id = table_config["table_id"]
         table_ref = f"{self.project_id}.{self.dataset_id}.{table_id}"
-        schema = self.create_schema(self._website_table["fields"])
-        return bigquery.Table(table_ref, schema)
+        schema = self.create_schema(table_config["fields"])
+        table = bigquery.Table(table_ref, schema)
+        # partitionnement par jour et clustering : seules les données utiles sont
+        # lues par les requêtes filtrées sur ces colonnes
+        if "partition_field" in table_config:
+            table.time_partitioning = bigquery.TimePartitioning(
+                type_=bigquery.TimePartitioningType.DAY,
+                field=table_config["partition_field"],
+            )
+        if "clustering_fields" in table_config:
+            table.clustering_fields = table_config["clustering_fields"]
+        return table
 
     @staticmethod
     def create_schema(fields: dict[str, str]):
@@ -51,13 +93,55 @@ class BigQueryConfig:
 class GoogleCloudConfig:
     storage: StorageConfig
     bigquery: BigQueryConfig
+    snapshot_cache: dict | None = None
+    # emplacement des points de reprise du scraping (même format que
+    # snapshot_cache)
+    checkpoint: dict | None = None
+    # résultats de chaque tâche d'une exécution répartie (même format)
+    shards: dict | None = None
 
 
 @dataclass
 class ScrapeConfig:
-    url: str
+    url: str | list[str]
     send_alert: bool
     min_discount: int
+    n_workers: int | None = None
+    use_http: bool = False
+    reveal_mode: str = "click"
+    incremental: bool = False
+    # abonné (email) -> URLs des sites suivis ; par défaut, l'expéditeur reçoit
+    # les alertes de tous les sites
+    subscribers: dict[str, list[str]] | None = None
+    driver_max_uses: int = 20
+    driver_max_memory_mb: float = 1500
+    # mode service : intervalle entre deux scrapings d'un site, en heures, avec
+    # d'éventuelles valeurs propres à certains sites (URL -> heures)
+    interval_hours: float = 24
+    schedule: dict[str, float] | None = None
+    # serveur d'envoi des alertes (ex. serveur local sans SSL pour les tests)
+    smtp_host: str = "smtp.gmail.com"
+    smtp_port: int = 465
+    smtp_ssl: bool = True
+    # dossier où les codes de chaque site sont exportés en Parquet au fil de
+    # leur révélation (un fichier par site et par jour)
+    export_dir: str | None = None
+
+    @property
+    def urls(self) -> list[str]:
+        if isinstance(self.url, str):
+            return [self.url]
+        return list(self.url)
+
+    def interval(self, url: str) -> datetime.timedelta:
+        hours = (self.schedule or {}).get(url, self.interval_hours)
+        return datetime.timedelta(hours=hours)
+
+
+@dataclass
+class BrowserConfig:
+    options: list[str]
+    profile: str = "default"
 
 
 def read_cloud_config(config_file: str) -> GoogleCloudConfig:
@@ -65,24 +149,55 @@ def read_cloud_config(config_file: str) -> GoogleCloudConfig:
         data = json.load(file)
     storage_config = StorageConfig(**data["storage"])
     bigquery_config = BigQueryConfig(**data["bigquery"])
-    return GoogleCloudConfig(storage=storage_config, bigquery=bigquery_config)
+    return GoogleCloudConfig(
+        storage=storage_config,
+        bigquery=bigquery_config,
+        snapshot_cache=data.get("snapshot_cache"),
+        checkpoint=data.get("checkpoint"),
+        shards=data.get("shards"),
+    )
+
+
+_buckets = TTLCache(ttl=math.inf)
+_blobs = TTLCache()
+
+
+def get_bucket(storage_config: StorageConfig) -> storage.Bucket:
+    return _buckets.get_or_set(
+        (storage_config.project_id, storage_config.bucket_name),
+        lambda: storage_config.client.get_bucket(storage_config.bucket_name),
+    )
+
+
+def load_json_blob(storage_config: StorageConfig, path: str) -> dict:
+    # le contenu est gardé en mémoire ; après expiration du TTL, il n'est
+    # téléchargé à nouveau que si la génération du blob a changé
+    key = (storage_config.bucket_name, path)
+    cached = _blobs.get(key)
+    if cached is None:
+        bucket = get_bucket(storage_config)
+        blob = bucket.get_blob(path)
+        if blob is None:
+            raise FileNotFoundError(f"gs://{storage_config.bucket_name}/{path}")
+        cached = _blobs.get(key, max_age=math.inf)
+        if cached is None or cached[0] != blob.generation:
+            data = json.loads(
+                blob.download_as_bytes(if_generation_match=blob.generation)
+            )
+            cached = (blob.generation, data)
+        _blobs.set(key, cached)
+    return copy.deepcopy(cached[1])
 
 
 def load_scrape_config_from_storage(storage_config: StorageConfig):
-    bucket = storage_config.client.get_bucket(storage_config.bucket_name)
-    blob = bucket.blob(storage_config.scrape_config_path)
-
-    with blob.open(mode="rb") as file:
-        data = json.load(file)
-
+    data = load_json_blob(storage_config, storage_config.scrape_config_path)
     return ScrapeConfig(**data)
 
 
-def load_browser_options(storage_config: StorageConfig) -> list:
-    bucket = storage_config.client.get_bucket(storage_config.bucket_name)
-    blob = bucket.blob(storage_config.browser_options_path)
+def load_browser_config(storage_config: StorageConfig) -> BrowserConfig:
+    data = load_json_blob(storage_config, storage_config.browser_options_path)
+    return BrowserConfig(**data)
 
-    with blob.open(mode="rb") as file:
-        data = json.load(file)
 
-    return data["options"]
+def load_browser_options(storage_config: StorageConfig) -> list:
+    return load_browser_config(storage_config).options
@@ -1 +1,5 @@
 TIMEOUT = 10
+# démarrage des processus de scraping (voir pool.worker_context) ; les objets
+# partagés avec eux doivent être créés dans le même contexte
+WORKER_START_METHOD = "forkserver"
+CACHE_TTL = 300
@@ -8,7 +8,7 @@ from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 
-from . import constants
+from . import constants, tracing
 
 BROWSER_OPTIONS = (
     # "--headless",
@@ -21,13 +21,102 @@ BROWSER_OPTIONS = (
 )
 
 
-def init_driver(options: list | tuple = BROWSER_OPTIONS):
+# profil "lean" : on ne télécharge que ce qui est nécessaire pour lire les codes
+LEAN_BLOCKED_URLS = (
+    # images
+    "*.png*",
+    "*.jpg*",
+    "*.jpeg*",
+    "*.gif*",
+    "*.webp*",
+    "*.avif*",
+    "*.svg*",
+    "*.ico*",
+    # polices
+    "*.woff*",
+    "*.ttf*",
+    "*.otf*",
+    "*fonts.googleapis.com*",
+    "*fonts.gstatic.com*",
+    # médias
+    "*.mp4*",
+    "*.webm*",
+    # publicités et mesure d'audience
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*googlesyndication.com*",
+    "*doubleclick.net*",
+    "*facebook.net*",
+    "*hotjar.com*",
+    "*criteo.*",
+    "*taboola.com*",
+    "*outbrain.com*",
+    "*analytics*",
+)
+
+LEAN_PREFS = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.managed_default_content_settings.notifications": 2,
+    "profile.managed_default_content_settings.geolocation": 2,
+    "profile.managed_default_content_settings.media_stream": 2,
+}
+
+PROFILES = {
+    "default": {"page_load_strategy": "normal", "prefs": {}, "blocked_urls": ()},
+    "lean": {
+        "page_load_strategy": "eager",
+        "prefs": LEAN_PREFS,
+        "blocked_urls": LEAN_BLOCKED_URLS,
+    },
+}
+
+
+def block_urls(
+    driver: webdriver.Chrome, url_patterns: list[str] | tuple[str, ...]
+) -> None:
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(url_patterns)})
+
+
+def switch_to_window(driver: webdriver.Chrome, handle: str) -> None:
+    # le blocage CDP ne s'applique qu'à l'onglet où il a été activé : il est
+    # réappliqué à chaque changement d'onglet (les codes s'affichent dans les
+    # onglets ouverts par "voir le code")
+    driver.switch_to.window(handle)
+    blocked_urls = getattr(driver, "blocked_urls", ())
+    if blocked_urls:
+        block_urls(driver, blocked_urls)
+
+
+@tracing.traced("init_driver")
+def init_driver(
+    options: list | tuple = BROWSER_OPTIONS,
+    performance_log: bool = False,
+    profile: str = "default",
+):
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown browser profile {profile!r}.")
+    settings = PROFILES[profile]
+
     chrome_options = Options()
     for option in options:
         chrome_options.add_argument(option)
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.page_load_strategy = settings["page_load_strategy"]
+    if settings["prefs"]:
+        chrome_options.add_experimental_option("prefs", settings["prefs"])
+    if performance_log:
+        # journal des événements réseau CDP, lu avec driver.get_log("performance")
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
     service = Service()
-    return webdriver.Chrome(options=chrome_options, service=service)
+    driver = webdriver.Chrome(options=chrome_options, service=service)
+
+    driver.blocked_urls = tuple(settings["blocked_urls"])
+    if driver.blocked_urls:
+        block_urls(driver, driver.blocked_urls)
+    tracing.instrument_driver(driver)
+
+    return driver
 
 
 def get_element(
@@ -35,9 +124,10 @@ def get_element(
     css_selector: str,
     timeout: int = constants.TIMEOUT,
 ) -> WebElement:
-    element = WebDriverWait(driver, timeout).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, css_selector))
-    )
+    with tracing.span("get_element", css_selector=css_selector):
+        element = WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, css_selector))
+        )
     return element
 
 
@@ -46,9 +136,10 @@ def get_elements(
     css_selector: str,
     timeout: int = constants.TIMEOUT,
 ) -> list[WebElement]:
-    elements = WebDriverWait(driver, timeout).until(
-        EC.presence_of_all_elements_located((By.CSS_SELECTOR, css_selector))
-    )
+    with tracing.span("get_elements", css_selector=css_selector):
+        elements = WebDriverWait(driver, timeout).until(
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, css_selector))
+        )
     return elements
 
 
@@ -57,8 +148,37 @@ def get_element_texts(
     css_selector: str,
     timeout: int = constants.TIMEOUT,
 ) -> list[str]:
-    elements = get_elements(driver, css_selector, timeout)
-    return [element.text for element in elements]
+    with tracing.span("get_element_texts", css_selector=css_selector):
+        elements = get_elements(driver, css_selector, timeout)
+        return [element.text for element in elements]
+
+
+# renvoie en un seul aller-retour le texte de chaque champ, groupé par carte
+GET_CARD_TEXTS_SCRIPT = """
+const [cardSelector, fieldSelectors] = arguments;
+return Array.from(document.querySelectorAll(cardSelector)).map((card) => {
+    const row = {};
+    for (const [field, selector] of Object.entries(fieldSelectors)) {
+        const element = card.querySelector(selector);
+        row[field] = element === null ? null : element.innerText;
+    }
+    return row;
+});
+"""
+
+
+def get_card_texts(
+    driver: Union[webdriver.Chrome, webdriver.Firefox],
+    card_css_selector: str,
+    field_css_selectors: dict[str, str],
+    timeout: int = constants.TIMEOUT,
+) -> list[dict[str, str | None]]:
+    # les sélecteurs des champs sont relatifs à la carte (":scope ...")
+    with tracing.span("get_card_texts", css_selector=card_css_selector):
+        get_elements(driver, card_css_selector, timeout)
+        return driver.execute_script(
+            GET_CARD_TEXTS_SCRIPT, card_css_selector, field_css_selectors
+        )
 
 
 def click_element(
@@ -66,7 +186,8 @@ def click_element(
     css_selector: str,
     timeout: int = constants.TIMEOUT,
 ) -> None:
-    element = WebDriverWait(driver, timeout).until(
-        EC.element_to_be_clickable((By.CSS_SELECTOR, css_selector))
-    )
-    element.click()
+    with tracing.span("click_element", css_selector=css_selector):
+        element = WebDriverWait(driver, timeout).until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, css_selector))
+        )
+        element.click()
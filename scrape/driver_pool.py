@@ -0,0 +1,137 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+import psutil
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+from .driver import BROWSER_OPTIONS, init_driver, switch_to_window
+
+MAX_USES = 20
+MAX_MEMORY_MB = 1500
+
+
+def driver_memory_mb(driver: webdriver.Chrome) -> float:
+    # mémoire résidente de chromedriver et de tous les processus Chrome lancés
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process, *process.children(recursive=True)]
+        rss = 0
+        for proc in processes:
+            try:
+                rss += proc.memory_info().rss
+            except psutil.NoSuchProcess:
+                continue
+    except (AttributeError, psutil.Error):
+        return 0.0
+    return rss / 2**20
+
+
+def is_healthy(driver: webdriver.Chrome) -> bool:
+    try:
+        return driver.execute_script("return 1;") == 1
+    except WebDriverException:
+        return False
+
+
+def reset_driver(driver: webdriver.Chrome) -> None:
+    # ferme les onglets supplémentaires et efface l'état laissé par le site
+    # précédent
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    switch_to_window(driver, handles[0])
+    # delete_all_cookies ne supprime que les cookies du domaine de l'onglet : ceux
+    # des redirections vers les marchands resteraient pour le site suivant
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    driver.get("about:blank")
+
+
+def quit_driver(driver: webdriver.Chrome) -> None:
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class DriverPool:
+    def __init__(
+        self,
+        options: list | tuple = BROWSER_OPTIONS,
+        max_size: int = 1,
+        max_uses: int = MAX_USES,
+        max_memory_mb: float = MAX_MEMORY_MB,
+        performance_log: bool = False,
+        profile: str = "default",
+    ):
+        self.options = options
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self.performance_log = performance_log
+        self.profile = profile
+        self._idle: list[webdriver.Chrome] = []
+        self._uses: dict[int, int] = {}
+
+    def _new_driver(self) -> webdriver.Chrome:
+        driver = init_driver(
+            options=self.options,
+            performance_log=self.performance_log,
+            profile=self.profile,
+        )
+        self._uses[id(driver)] = 0
+        return driver
+
+    def discard(self, driver: webdriver.Chrome) -> None:
+        self._uses.pop(id(driver), None)
+        quit_driver(driver)
+
+    def acquire(self) -> webdriver.Chrome:
+        while self._idle:
+            driver = self._idle.pop()
+            if is_healthy(driver):
+                return driver
+            print("Unhealthy browser session, starting a new one.")
+            self.discard(driver)
+        return self._new_driver()
+
+    def release(self, driver: webdriver.Chrome) -> None:
+        self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+
+        # Chrome fuit de la mémoire : on recycle la session régulièrement
+        if self._uses[id(driver)] >= self.max_uses:
+            print("Browser session reached its maximum number of uses, recycling.")
+            self.discard(driver)
+            return
+        memory = driver_memory_mb(driver)
+        if memory > self.max_memory_mb:
+            print(f"Browser session uses {memory:.0f} MB, recycling.")
+            self.discard(driver)
+            return
+
+        try:
+            reset_driver(driver)
+        except WebDriverException:
+            self.discard(driver)
+            return
+
+        if len(self._idle) >= self.max_size:
+            self.discard(driver)
+        else:
+            self._idle.append(driver)
+
+    @contextmanager
+    def session(self) -> Iterator[webdriver.Chrome]:
+        driver = self.acquire()
+        try:
+            yield driver
+        except BaseException:
+            # le navigateur peut être dans un état incohérent
+            self.discard(driver)
+            raise
+        self.release(driver)
+
+    def close(self) -> None:
+        while self._idle:
+            self.discard(self._idle.pop())
@@ -0,0 +1,63 @@
+from functools import lru_cache
+
+import requests
+from lxml import html as lxml_html
+from lxml.cssselect import CSSSelector
+
+HTTP_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "fr-FR,fr;q=0.9",
+}
+
+HTTP_TIMEOUT = 10
+
+
+@lru_cache(maxsize=None)
+def compile_selector(css_selector: str) -> CSSSelector:
+    return CSSSelector(css_selector)
+
+
+def download_page(
+    url: str,
+    session: requests.Session | None = None,
+    timeout: int = HTTP_TIMEOUT,
+) -> str:
+    getter = session.get if session is not None else requests.get
+    response = getter(url, headers=HTTP_HEADERS, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+
+def parse_html(page: str | bytes) -> lxml_html.HtmlElement:
+    return lxml_html.fromstring(page)
+
+
+def element_text(element: lxml_html.HtmlElement) -> str:
+    # reproduit approximativement WebElement.text : un retour à la ligne entre
+    # chaque bloc de texte, espaces consécutifs fusionnés
+    return "\n".join(
+        " ".join(text.split()) for text in element.itertext() if text and text.strip()
+    )
+
+
+def get_texts(tree: lxml_html.HtmlElement, css_selector: str) -> list[str]:
+    return [element_text(element) for element in compile_selector(css_selector)(tree)]
+
+
+def get_text(tree: lxml_html.HtmlElement, css_selector: str) -> str | None:
+    elements = compile_selector(css_selector)(tree)
+    if not elements:
+        return None
+    return element_text(elements[0])
+
+
+def extract_field_texts(
+    tree: lxml_html.HtmlElement, selectors: dict[str, str]
+) -> dict[str, list[str]]:
+    return {
+        field: get_texts(tree, css_selector)
+        for field, css_selector in selectors.items()
+    }
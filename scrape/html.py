@@ -1,4 +1,5 @@
-from typing import Hashable, Iterable, Optional
+import io
+from typing import Hashable, Iterable, Optional, TextIO, Tuple
 
 import pandas as pd
 
@@ -24,38 +25,55 @@ def style_to_str(name: str, mapper: dict[str, dict[str, str]] = STYLES) -> str:
     return "; ".join(f"{k}: {v}" for k, v in style.items())
 
 
-def df_to_html(
+def write_table(
     dataframe: pd.DataFrame,
+    stream: TextIO,
     new_code_idxs: Optional[Iterable[Hashable]] = None,
-):
-    if new_code_idxs is None:
-        new_code_idxs = []
-    data = dataframe.to_dict("index")
-    table_style = style_to_str("table")
-    header_style = style_to_str("header")
+) -> None:
+    # écrit la table au fur et à mesure : styles calculés une seule fois et
+    # recherche des lignes à surligner en temps constant
+    highlighted = set(new_code_idxs) if new_code_idxs is not None else set()
+    row_styles = (style_to_str("even"), style_to_str("odd"))
+    highlight_style = style_to_str("highlight")
+    write = stream.write
 
     # header
-    html = (
-        f'<table style="{table_style}" cellpadding="10">'
-        f'<tr style="{header_style}">'
+    write(
+        f'<table style="{style_to_str("table")}" cellpadding="10">'
+        f'<tr style="{style_to_str("header")}">'
     )
-    for col in next(iter(data.values())).keys():
-        html += f"<th>{col}</th>"
-    html += "</tr>"
+    write("".join(f"<th>{col}</th>" for col in dataframe.columns))
+    write("</tr>")
 
     # rows
-    for i, (index, row) in enumerate(data.items()):
-        if index in new_code_idxs:
-            style = style_to_str("highlight")
-        elif i % 2 == 0:
-            style = style_to_str("even")
-        else:
-            style = style_to_str("odd")
-        html += f'<tr style="{style}">'
-        for val in row.values():
-            html += f"<td>{val}</td>"
-        html += "</tr>"
-
-    html += "</tr></table>"
-
-    return html
+    for i, (index, *row) in enumerate(dataframe.itertuples(name=None)):
+        style = highlight_style if index in highlighted else row_styles[i % 2]
+        write(f'<tr style="{style}">')
+        # cellule vide pour les valeurs manquantes (None, NaN, <NA>)
+        write("".join(f"<td>{'' if pd.isna(val) else val}</td>" for val in row))
+        write("</tr>")
+
+    write("</tr></table>")
+
+
+def df_to_html(
+    dataframe: pd.DataFrame,
+    new_code_idxs: Optional[Iterable[Hashable]] = None,
+) -> str:
+    stream = io.StringIO()
+    write_table(dataframe, stream, new_code_idxs)
+    return stream.getvalue()
+
+
+def dfs_to_html(
+    sections: Iterable[Tuple[str, pd.DataFrame, Optional[Iterable[Hashable]]]],
+    stream: Optional[TextIO] = None,
+) -> str | None:
+    # plusieurs sites dans un même document : (titre, table, index surlignés)
+    output = stream if stream is not None else io.StringIO()
+    for title, dataframe, new_code_idxs in sections:
+        output.write(f"<h3>{title}</h3>")
+        write_table(dataframe, output, new_code_idxs)
+    if stream is None:
+        return output.getvalue()
+    return None
@@ -0,0 +1,45 @@
+import importlib
+import importlib.util
+import sys
+import threading
+from types import ModuleType
+
+
+class LazyModule(ModuleType):
+    # remplaçant du module, importé au premier accès à l'un de ses attributs.
+    # Contrairement à importlib.util.LazyLoader (non sûr entre threads en
+    # Python 3.11), le vrai module est importé normalement, sous verrou, et le
+    # remplaçant n'est jamais placé dans sys.modules
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__["_module"]
+        if module is None:
+            with self.__dict__["_lock"]:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+    def __dir__(self) -> list[str]:
+        return dir(self._load())
+
+
+def lazy_import(name: str) -> ModuleType:
+    # le module n'est réellement importé qu'au premier accès à l'un de ses
+    # attributs
+    if name in sys.modules:
+        return sys.modules[name]
+    # seul le paquet racine est cherché : chercher un sous-module importerait
+    # ses paquets parents (ex. pyarrow pour pyarrow.parquet)
+    package = name.partition(".")[0]
+    if importlib.util.find_spec(package) is None:
+        raise ModuleNotFoundError(f"No module named {package!r}", name=package)
+    return LazyModule(name)
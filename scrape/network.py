@@ -0,0 +1,119 @@
+import json
+from collections import Counter
+from typing import Any, Iterator, Union
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+# clés sous lesquelles le site expose le code et le titre d'un bon de réduction
+CODE_KEYS = ("code", "voucherCode", "couponCode", "promoCode")
+TITLE_KEYS = ("title", "description", "caption", "name")
+
+JSON_MIME_TYPES = ("application/json", "text/json", "application/ld+json")
+
+GET_EMBEDDED_DATA_SCRIPT = """
+return Array.from(
+    document.querySelectorAll('script[type="application/json"], #__NEXT_DATA__')
+).map((script) => script.textContent);
+"""
+
+
+def enable_network_capture(
+    driver: Union[webdriver.Chrome, webdriver.Firefox]
+) -> None:
+    # nécessite un driver lancé avec le journal "performance"
+    # (init_driver(performance_log=True))
+    driver.execute_cdp_cmd("Network.enable", {})
+
+
+def normalize_title(title: str) -> str:
+    return " ".join(title.split()).casefold()
+
+
+def iter_voucher_objects(payload: Any) -> Iterator[dict]:
+    stack = [payload]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            if any(isinstance(item.get(key), str) for key in CODE_KEYS):
+                yield item
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+
+
+def find_codes_in_payload(payload: Any) -> dict[str, set[str]]:
+    # titre normalisé -> codes distincts trouvés sous ce titre
+    codes = {}
+    for item in iter_voucher_objects(payload):
+        code = next(
+            item[key] for key in CODE_KEYS if isinstance(item.get(key), str)
+        ).strip()
+        if not code:
+            continue
+        for key in TITLE_KEYS:
+            if isinstance(item.get(key), str):
+                codes.setdefault(normalize_title(item[key]), set()).add(code)
+    return codes
+
+
+def iter_json_responses(
+    driver: Union[webdriver.Chrome, webdriver.Firefox]
+) -> Iterator[Any]:
+    # vide le journal "performance" et télécharge le corps des réponses JSON
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        if message["method"] != "Network.responseReceived":
+            continue
+        params = message["params"]
+        if not params["response"].get("mimeType", "").startswith(JSON_MIME_TYPES):
+            continue
+        try:
+            body = driver.execute_cdp_cmd(
+                "Network.getResponseBody", {"requestId": params["requestId"]}
+            )
+            yield json.loads(body["body"])
+        except (WebDriverException, ValueError):
+            # réponse déjà libérée par Chrome ou corps non JSON
+            continue
+
+
+def iter_embedded_json(
+    driver: Union[webdriver.Chrome, webdriver.Firefox]
+) -> Iterator[Any]:
+    for text in driver.execute_script(GET_EMBEDDED_DATA_SCRIPT):
+        try:
+            yield json.loads(text)
+        except (TypeError, ValueError):
+            continue
+
+
+def harvest_codes(
+    driver: Union[webdriver.Chrome, webdriver.Firefox]
+) -> dict[str, str]:
+    codes = {}
+
+    def add(payload: Any) -> None:
+        for title, title_codes in find_codes_in_payload(payload).items():
+            codes.setdefault(title, set()).update(title_codes)
+
+    for payload in iter_embedded_json(driver):
+        add(payload)
+    try:
+        for payload in iter_json_responses(driver):
+            add(payload)
+    except WebDriverException:
+        # journal "performance" non activé
+        pass
+    # un titre associé à plusieurs codes (objets JSON sans rapport avec les bons
+    # de réduction, offres homonymes) ne permet pas de choisir : la carte sera
+    # révélée par un clic
+    return {title: codes.pop() for title, codes in codes.items() if len(codes) == 1}
+
+
+def match_codes(descriptions: list[str], codes: dict[str, str]) -> list[str | None]:
+    # les cartes de même titre ne peuvent pas être distinguées : elles sont
+    # révélées par un clic
+    titles = [normalize_title(description) for description in descriptions]
+    counts = Counter(titles)
+    return [codes.get(title) if counts[title] == 1 else None for title in titles]
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import datetime
+import re
+from typing import Iterable, Optional
+
+from .lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+MONTHS_FR = {
+    "janv.": 1,
+    "févr.": 2,
+    "mars": 3,
+    "avr.": 4,
+    "mai": 5,
+    "juin": 6,
+    "juill.": 7,
+    "août": 8,
+    "sept.": 9,
+    "oct.": 10,
+    "nov.": 11,
+    "déc.": 12,
+}
+
+# une seule expression pour tous les formats de date d'expiration :
+# "Expire aujourd'hui", "Expire demain", "Expire le : 12 déc."
+EXP_DATE_PATTERN = re.compile(
+    r"(?P<today>aujourd'hui)"
+    r"|(?P<tomorrow>demain)"
+    r"|(?P<day>\d{1,2})(?:er)?\s+(?P<month>"
+    + "|".join(re.escape(month) for month in MONTHS_FR)
+    + r")"
+)
+
+DISCOUNT_PATTERN = re.compile(r"(?P<discount>\d+)\s*%")
+
+
+def to_series(values: Iterable[str] | pd.Series) -> pd.Series:
+    if isinstance(values, pd.Series):
+        return values.astype("string")
+    return pd.Series(list(values), dtype="string")
+
+
+def parse_discounts(values: Iterable[str] | pd.Series) -> pd.Series:
+    # "20%\nde réduction" -> 20 ; les valeurs illisibles valent 0
+    discounts = to_series(values).str.extract(DISCOUNT_PATTERN)["discount"]
+    return pd.to_numeric(discounts, errors="coerce").fillna(0).astype(int)
+
+
+def build_dates(year: int, month: pd.Series, day: pd.Series) -> pd.Series:
+    # les valeurs manquantes sont remplacées le temps de l'assemblage, puis mises
+    # à NaT comme les dates invalides (ex. 31 févr.)
+    missing = month.isna() | day.isna()
+    dates = pd.to_datetime(
+        pd.DataFrame(
+            {
+                "year": year,
+                "month": month.fillna(1).astype(int),
+                "day": day.fillna(1).astype(int),
+            },
+            index=month.index,
+        ),
+        errors="coerce",
+    )
+    return dates.mask(missing)
+
+
+def parse_expiration_dates(
+    values: Iterable[str] | pd.Series, today: Optional[datetime.date] = None
+) -> pd.Series:
+    # renvoie des datetime.date, ou None pour les valeurs illisibles
+    today = pd.Timestamp(today if today is not None else datetime.date.today())
+    parts = to_series(values).str.extract(EXP_DATE_PATTERN)
+
+    month = parts["month"].map(MONTHS_FR).astype(float)
+    day = pd.to_numeric(parts["day"], errors="coerce").astype(float)
+    dates = build_dates(today.year, month, day)
+
+    # une date déjà passée cette année correspond à l'année suivante
+    past = dates < today
+    if past.any():
+        dates = dates.mask(past, build_dates(today.year + 1, month, day))
+
+    dates = dates.mask(parts["today"].notna(), today)
+    dates = dates.mask(parts["tomorrow"].notna(), today + pd.Timedelta(days=1))
+
+    result = dates.dt.date.astype(object)
+    result[dates.isna()] = None
+    return result
+
+
+def days_until(
+    dates: Iterable[datetime.date] | pd.Series,
+    today: Optional[datetime.date] = None,
+) -> pd.Series:
+    today = pd.Timestamp(today if today is not None else datetime.date.today())
+    index = dates.index if isinstance(dates, pd.Series) else None
+    dates = pd.to_datetime(pd.Series(list(dates), index=index), errors="coerce")
+    # entiers nullables : une date illisible ne transforme pas la colonne en
+    # flottants
+    return (dates - today).dt.days.astype("Int64")
@@ -0,0 +1,216 @@
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from multiprocessing import util
+from typing import Iterable, Optional
+
+from . import cache, constants, tracing
+from .config import StorageConfig
+from .driver import BROWSER_OPTIONS
+from .driver_pool import MAX_MEMORY_MB, MAX_USES, DriverPool
+from .queries import create_snapshot_store
+from .ratelimit import RateLimiter
+from .scraper import CodeScraper, ScrapeResult
+
+# chaque processus du pool garde sa propre session Chrome, réutilisée d'un site
+# à l'autre
+_driver_pool: Optional[DriverPool] = None
+_scraper_kwargs: dict = {}
+
+
+def _close_worker_pool() -> None:
+    if _driver_pool is not None:
+        _driver_pool.close()
+
+
+def _init_worker(
+    options: list | tuple,
+    driver_pool_kwargs: dict,
+    scraper_kwargs: dict,
+    checkpoint_config: Optional[dict] = None,
+    storage_config: Optional[StorageConfig] = None,
+) -> None:
+    global _driver_pool, _scraper_kwargs
+    _driver_pool = DriverPool(
+        options=options,
+        performance_log=scraper_kwargs.get("reveal_mode") == "network",
+        **driver_pool_kwargs,
+    )
+    _scraper_kwargs = scraper_kwargs
+    # le stockage des points de reprise est créé dans chaque worker, avec son
+    # propre client : un client hérité du parent (selon le mode de démarrage des
+    # processus) partagerait ses connexions avec lui
+    cache.reset_shared_clients()
+    if checkpoint_config:
+        _scraper_kwargs["checkpoint_store"] = create_snapshot_store(
+            checkpoint_config, storage_config
+        )
+    # ferme Chrome à l'arrêt du processus (atexit n'est pas appelé dans les
+    # processus enfants de multiprocessing)
+    util.Finalize(None, _close_worker_pool, exitpriority=10)
+
+
+def _scrape_url(
+    url: str, known_codes: Optional[dict[str, str]] = None
+) -> Optional[ScrapeResult]:
+    with _driver_pool.session() as driver:
+        return CodeScraper(
+            driver, url, known_codes=known_codes, **_scraper_kwargs
+        ).scrape()
+
+
+def _warm_up() -> None:
+    # démarre le navigateur du worker sans attendre la première URL
+    with _driver_pool.session():
+        pass
+
+
+def default_n_workers() -> int:
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def worker_context() -> multiprocessing.context.BaseContext:
+    # les workers ne sont pas forkés depuis le processus principal : ses threads
+    # (vérifications en parallèle, asyncio.to_thread) peuvent tenir des verrous
+    # au moment du fork, que l'enfant hériterait verrouillés (ex. celui des
+    # clients partagés). Le serveur de fork, sans threads, précharge ce module
+    # pour que chaque worker démarre sans réimporter selenium ni pandas
+    context = multiprocessing.get_context(constants.WORKER_START_METHOD)
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+class ScrapePool:
+    # pool de processus pouvant être démarré (et ses navigateurs lancés) avant
+    # que la liste définitive des URLs à scraper soit connue
+    def __init__(
+        self,
+        urls: Iterable[str],
+        options: list | tuple = BROWSER_OPTIONS,
+        n_workers: Optional[int] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        driver_max_uses: int = MAX_USES,
+        driver_max_memory_mb: float = MAX_MEMORY_MB,
+        profile: str = "default",
+        checkpoint_config: Optional[dict] = None,
+        storage_config: Optional[StorageConfig] = None,
+        **scraper_kwargs,
+    ):
+        # urls : tous les sites susceptibles d'être scrapés par ce pool
+        urls = list(dict.fromkeys(urls))
+        if n_workers is None:
+            n_workers = default_n_workers()
+        self.n_workers = max(1, min(n_workers, len(urls)))
+
+        # le limiteur est partagé entre les workers pour les sites d'un même
+        # domaine : ses seaux doivent exister avant le lancement des processus
+        if rate_limiter is None:
+            rate_limiter = RateLimiter()
+        rate_limiter.register(urls)
+        self.rate_limiter = rate_limiter
+        scraper_kwargs["rate_limiter"] = rate_limiter
+        # sites en échec lors du dernier appel à scrape
+        self.failed: list[str] = []
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=worker_context(),
+            initializer=_init_worker,
+            initargs=(
+                options,
+                {
+                    "max_uses": driver_max_uses,
+                    "max_memory_mb": driver_max_memory_mb,
+                    "profile": profile,
+                },
+                scraper_kwargs,
+                checkpoint_config,
+                storage_config,
+            ),
+        )
+
+    def start_warm_up(self) -> list[Future]:
+        # démarre le navigateur de chaque worker sans attendre
+        return [self.executor.submit(_warm_up) for _ in range(self.n_workers)]
+
+    @tracing.traced("ScrapePool.warm_up")
+    def warm_up(self) -> None:
+        for future in self.start_warm_up():
+            future.result()
+
+    @tracing.traced("ScrapePool.scrape")
+    def scrape(
+        self,
+        urls: Iterable[str],
+        known_codes: Optional[dict[str, dict[str, str]]] = None,
+    ) -> list[ScrapeResult]:
+        # known_codes : codes déjà connus pour chaque URL (mode incrémental)
+        known_codes = known_codes or {}
+        futures = {
+            self.executor.submit(_scrape_url, url, known_codes.get(url)): url
+            for url in dict.fromkeys(urls)
+        }
+        results = []
+        self.failed = []
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # un site en échec ne doit pas bloquer les autres
+                print(f"Scraping failed for {url!r}: {e!r}")
+                self.failed.append(url)
+                continue
+            if result is None:
+                print(f"No codes found for {url!r}.")
+                continue
+            results.append(result)
+
+        for domain, stats in self.rate_limiter.stats().items():
+            print(
+                f"Rate limit for {domain}: {stats['rate']:.2f} req/s, "
+                f"{stats['total_wait']:.1f} s spent waiting."
+            )
+        return results
+
+    def close(self, cancel: bool = False) -> None:
+        # cancel : abandonne les tâches en attente et arrête les workers sans
+        # attendre celles en cours (ex. un navigateur en train de démarrer), que
+        # shutdown laisserait se terminer
+        if cancel:
+            for process in list(self.executor._processes.values()):
+                process.terminate()
+        self.executor.shutdown(wait=not cancel, cancel_futures=cancel)
+
+    def __enter__(self) -> "ScrapePool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close(cancel=exc_info[0] is not None)
+
+
+def scrape_urls(
+    urls: Iterable[str],
+    options: list | tuple = BROWSER_OPTIONS,
+    n_workers: Optional[int] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    known_codes: Optional[dict[str, dict[str, str]]] = None,
+    driver_max_uses: int = MAX_USES,
+    driver_max_memory_mb: float = MAX_MEMORY_MB,
+    profile: str = "default",
+    **scraper_kwargs,
+) -> list[ScrapeResult]:
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return []
+    with ScrapePool(
+        urls,
+        options=options,
+        n_workers=n_workers,
+        rate_limiter=rate_limiter,
+        driver_max_uses=driver_max_uses,
+        driver_max_memory_mb=driver_max_memory_mb,
+        profile=profile,
+        **scraper_kwargs,
+    ) as pool:
+        return pool.scrape(urls, known_codes)
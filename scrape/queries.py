@@ -1,12 +1,29 @@
+from __future__ import annotations
+
 import datetime
-from typing import Union
+import fcntl
+import functools
+import io
+import json
+import os
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional, Union
 
-import pandas as pd
-from google.cloud import bigquery, exceptions
+from .codes import code_fingerprints
+from .config import BigQueryConfig, StorageConfig
+from . import tracing
+from .lazy import lazy_import
+from .utils import generate_hash_key_md5
 
-from scrape.scraper import ScrapeResult
+if TYPE_CHECKING:
+    from scrape.scraper import ScrapeResult
 
-from .config import BigQueryConfig
+# chargés à la première utilisation : la vérification de la dernière exécution
+# n'a besoin ni de pandas ni de pyarrow
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+bigquery = lazy_import("google.cloud.bigquery")
+exceptions = lazy_import("google.cloud.exceptions")
+storage = lazy_import("google.cloud.storage")
 
 
 def check_dataset_exists(
@@ -35,78 +52,615 @@ def check_table_exists(
         return False
 
 
-def last_execution(url: str, bigquery_config: BigQueryConfig) -> datetime.date:
+class LocalSnapshotStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def read_bytes(self, name: str) -> bytes:
+        with open(os.path.join(self.directory, name), "rb") as file:
+            return file.read()
+
+    def write_bytes(self, name: str, data: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        # écriture atomique pour ne jamais lire un fichier incomplet
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def read_versioned(self, name: str) -> tuple[Optional[bytes], Any]:
+        # contenu et version du fichier (None, None s'il n'existe pas)
+        try:
+            with open(os.path.join(self.directory, name), "rb") as file:
+                stat = os.fstat(file.fileno())
+                return file.read(), (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return None, None
+
+    def write_if_unchanged(self, name: str, data: bytes, version: Any) -> bool:
+        # écrit seulement si le fichier est toujours à la version lue (None : le
+        # fichier ne doit pas exister) ; le verrou sérialise les processus
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        with open(f"{path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                stat = os.stat(path)
+                current = (stat.st_ino, stat.st_mtime_ns)
+            except FileNotFoundError:
+                current = None
+            if current != version:
+                return False
+            self.write_bytes(name, data)
+        return True
+
+    def create_bytes(self, name: str, data: bytes) -> bool:
+        # False si le fichier existe déjà
+        return self.write_if_unchanged(name, data, None)
+
+    def delete(self, name: str) -> None:
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+
+class GCSSnapshotStore:
+    def __init__(self, bucket: storage.Bucket, prefix: str):
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/")
+
+    def read_bytes(self, name: str) -> bytes:
+        try:
+            return self.bucket.blob(f"{self.prefix}/{name}").download_as_bytes()
+        except exceptions.NotFound:
+            raise FileNotFoundError(name)
+
+    def write_bytes(self, name: str, data: bytes) -> None:
+        self.bucket.blob(f"{self.prefix}/{name}").upload_from_string(data)
+
+    def read_versioned(self, name: str) -> tuple[Optional[bytes], Optional[int]]:
+        # contenu et génération de l'objet (None, None s'il n'existe pas)
+        blob = self.bucket.blob(f"{self.prefix}/{name}")
+        try:
+            data = blob.download_as_bytes()
+        except exceptions.NotFound:
+            return None, None
+        return data, blob.generation
+
+    def write_if_unchanged(
+        self, name: str, data: bytes, version: Optional[int]
+    ) -> bool:
+        # précondition de génération (0 : l'objet ne doit pas exister)
+        try:
+            self.bucket.blob(f"{self.prefix}/{name}").upload_from_string(
+                data, if_generation_match=version or 0
+            )
+        except exceptions.PreconditionFailed:
+            return False
+        return True
+
+    def create_bytes(self, name: str, data: bytes) -> bool:
+        # False si l'objet existe déjà
+        return self.write_if_unchanged(name, data, None)
+
+    def delete(self, name: str) -> None:
+        try:
+            self.bucket.blob(f"{self.prefix}/{name}").delete()
+        except exceptions.NotFound:
+            pass
+
+
+class SnapshotCache:
+    # garde pour chaque site (website_id) la date de dernière exécution et les
+    # derniers codes. Chaque entrée mémorise la date de modification de la table
+    # des codes au moment où elle a été écrite : elle n'est valide que si la table
+    # n'a pas été modifiée depuis.
+    INDEX = "index.json"
+    INDEX_RETRIES = 5
+
+    def __init__(
+        self, store: LocalSnapshotStore | GCSSnapshotStore, exclusive: bool = True
+    ):
+        # exclusive : ce processus est le seul à écrire dans la table des codes
+        # (ni tâches en parallèle, ni workers concurrents)
+        self.store = store
+        self.exclusive = exclusive
+
+    def read_index(self) -> dict[str, dict]:
+        try:
+            return json.loads(self.store.read_bytes(self.INDEX))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def update_index(self, update: Callable[[dict[str, dict]], None]) -> None:
+        # lecture-modification-écriture avec précondition de version : si un
+        # autre processus a écrit l'index entre-temps, la mise à jour est
+        # réappliquée sur sa version
+        for _ in range(self.INDEX_RETRIES):
+            data, version = self.store.read_versioned(self.INDEX)
+            try:
+                index = json.loads(data) if data is not None else {}
+            except ValueError:
+                index = {}
+            update(index)
+            if self.store.write_if_unchanged(
+                self.INDEX, json.dumps(index).encode(), version
+            ):
+                return
+        # l'entrée non écrite reste périmée : le cache sera simplement ignoré
+        print("Snapshot cache index is busy, entry not updated.")
+
+    def get_entry(self, website_id: str, table_modified: str) -> Optional[dict]:
+        entry = self.read_index().get(website_id)
+        if entry is None or entry["table_modified"] != table_modified:
+            return None
+        return entry
+
+    def read_frame(self, website_id: str, name: str) -> Optional[pd.DataFrame]:
+        try:
+            data = self.store.read_bytes(f"{website_id}.{name}.parquet")
+        except FileNotFoundError:
+            return None
+        return pd.read_parquet(io.BytesIO(data))
+
+    def write(
+        self,
+        website_id: str,
+        table_modified: str,
+        frames: Optional[dict[str, pd.DataFrame]] = None,
+        previous_table_modified: Optional[str] = None,
+        **values,
+    ) -> None:
+        # frames : tables mises en cache pour ce site (ex. "codes")
+        # values : valeurs mises en cache pour ce site (ex. last_execution)
+        frames = frames or {}
+        for name, frame in frames.items():
+            buffer = io.BytesIO()
+            frame.to_parquet(buffer, index=False)
+            self.store.write_bytes(f"{website_id}.{name}.parquet", buffer.getvalue())
+
+        def update(index: dict[str, dict]) -> None:
+            if previous_table_modified is not None and self.exclusive:
+                # la table n'a été modifiée que par notre écriture pour ce site :
+                # les entrées des autres sites qui étaient valides le restent.
+                # Avec des écritures concurrentes, un autre processus a pu
+                # modifier la table entre-temps : les entrées sont alors
+                # simplement invalidées
+                for entry in index.values():
+                    if entry["table_modified"] == previous_table_modified:
+                        entry["table_modified"] = table_modified
+
+            entry = index.get(website_id, {})
+            if entry.get("table_modified") != table_modified:
+                # entrée périmée : on repart de zéro
+                entry = {"table_modified": table_modified}
+            entry.update(values)
+            for name in frames:
+                entry[f"has_{name}"] = True
+            index[website_id] = entry
+
+        self.update_index(update)
+
+
+def create_snapshot_store(
+    store_config: Optional[dict], storage_config: StorageConfig
+) -> Optional[LocalSnapshotStore | GCSSnapshotStore]:
+    # {"location": "local", "path": ...} ou {"location": "gcs", "prefix": ...}
+    if not store_config:
+        return None
+    if store_config["location"] == "local":
+        return LocalSnapshotStore(store_config["path"])
+    if store_config["location"] == "gcs":
+        bucket = storage_config.client.bucket(storage_config.bucket_name)
+        return GCSSnapshotStore(bucket, store_config["prefix"])
+    raise ValueError(f"Unknown cache location {store_config['location']!r}.")
+
+
+def create_snapshot_cache(
+    cache_config: Optional[dict],
+    storage_config: StorageConfig,
+    exclusive: bool = True,
+) -> Optional[SnapshotCache]:
+    store = create_snapshot_store(cache_config, storage_config)
+    return None if store is None else SnapshotCache(store, exclusive=exclusive)
+
+
+def table_last_modified(bigquery_config: BigQueryConfig) -> Optional[str]:
+    try:
+        table = bigquery_config.client.get_table(bigquery_config.code_table)
+    except exceptions.NotFound:
+        return None
+    return table.modified.isoformat()
+
+
+def website_id_parameter(website_id: str) -> bigquery.QueryJobConfig:
+    return bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("website_id", "STRING", website_id)
+        ]
+    )
+
+
+def last_execution(
+    url: str,
+    bigquery_config: BigQueryConfig,
+    cache: Optional[SnapshotCache] = None,
+) -> datetime.date:
+    website_id = generate_hash_key_md5(url)
+    if cache is not None:
+        table_modified = table_last_modified(bigquery_config)
+        entry = cache.get_entry(website_id, table_modified)
+        if entry is not None and "last_execution" in entry:
+            value = entry["last_execution"]
+            return None if value is None else datetime.date.fromisoformat(value)
+
+    # le filtre sur website_id (colonne de clustering) limite les données lues
     query = f"""
         SELECT MAX(scraping_date) as last_execution
         FROM `{bigquery_config.code_table!s}`
-        INNER JOIN `{bigquery_config.website_table!s}` USING (website_id)
-        WHERE url = '{url}'
+        WHERE website_id = @website_id
         """
     try:
-        job = bigquery_config.client.query(query)
-        return next(job.result()).last_execution
+        with tracing.span("bigquery.query", operation="last_execution"):
+            job = bigquery_config.client.query(
+                query, job_config=website_id_parameter(website_id)
+            )
+            last_exec_date = next(job.result()).last_execution
+            tracing.record_bigquery_job(job)
     except exceptions.NotFound:
         print("Not found.")
         return
 
+    if cache is not None and table_modified is not None:
+        cache.write(
+            website_id,
+            table_modified,
+            last_execution=last_exec_date and last_exec_date.isoformat(),
+        )
+    return last_exec_date
 
-def download_previous_codes(
-    url: str, bigquery_config: BigQueryConfig
-) -> pd.DataFrame:
+
+# colonnes utiles à la détection des nouveaux codes et au mode incrémental
+PREVIOUS_CODE_COLUMNS = (
+    "code",
+    "discount",
+    "description",
+    "expiration_date",
+    "scraping_date",
+)
+
+
+def query_latest_codes_arrow(
+    website_id: str, bigquery_config: BigQueryConfig
+) -> pa.Table:
+    # codes de la dernière exécution pour ce site uniquement
     query = f"""
-        SELECT *
+        SELECT {", ".join(PREVIOUS_CODE_COLUMNS)}
         FROM `{bigquery_config.code_table!s}`
-        INNER JOIN `{bigquery_config.website_table!s}`
-        USING (website_id)
-        WHERE
-            url = '{url}'
-            AND scraping_date = (
-                SELECT MAX(scraping_date)
-                FROM `{bigquery_config.code_table!s}`
-            )
+        WHERE website_id = @website_id
+        QUALIFY scraping_date = MAX(scraping_date) OVER ()
         """
-    return bigquery_config.client.query(query).to_dataframe()
+    with tracing.span("bigquery.query", operation="latest_codes"):
+        job = bigquery_config.client.query(
+            query, job_config=website_id_parameter(website_id)
+        )
+        rows = job.result()
+        tracing.record_bigquery_job(job)
+        if not bigquery_config.use_storage_api:
+            return rows.to_arrow(create_bqstorage_client=False)
+        try:
+            # API Storage Read : téléchargement en flux Arrow plutôt que par pages
+            # JSON
+            return rows.to_arrow(create_bqstorage_client=True)
+        except exceptions.GoogleAPICallError as e:
+            print(f"Storage Read API unavailable ({e!r}), falling back to REST.")
+            return job.result().to_arrow(create_bqstorage_client=False)
 
 
-def upload_website_data(
-    result: ScrapeResult, bigquery_config: BigQueryConfig
-) -> None:
+def query_latest_codes(
+    website_id: str, bigquery_config: BigQueryConfig, arrow_backed: bool = False
+) -> pd.DataFrame:
+    table = query_latest_codes_arrow(website_id, bigquery_config)
+    if arrow_backed:
+        # colonnes pandas adossées aux tableaux Arrow, sans copie
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas(date_as_object=True)
+
+
+def latest_execution_and_codes(
+    url: str,
+    bigquery_config: BigQueryConfig,
+    cache: Optional[SnapshotCache] = None,
+) -> tuple[Optional[datetime.date], pd.DataFrame]:
+    # une seule requête pour la date de dernière exécution et les derniers codes
+    website_id = generate_hash_key_md5(url)
+    if cache is not None:
+        table_modified = table_last_modified(bigquery_config)
+        entry = cache.get_entry(website_id, table_modified)
+        if entry is not None and "last_execution" in entry and entry.get("has_codes"):
+            codes = cache.read_frame(website_id, "codes")
+            if codes is not None:
+                value = entry["last_execution"]
+                last_exec_date = (
+                    None if value is None else datetime.date.fromisoformat(value)
+                )
+                return last_exec_date, codes
+
+    codes = query_latest_codes(website_id, bigquery_config)
+    last_exec_date = None if codes.empty else codes["scraping_date"].iloc[0]
+
+    if cache is not None and table_modified is not None:
+        cache.write(
+            website_id,
+            table_modified,
+            frames={"codes": codes},
+            last_execution=last_exec_date and last_exec_date.isoformat(),
+        )
+    return last_exec_date, codes
+
+
+def query_fingerprints(website_id: str, bigquery_config: BigQueryConfig) -> set[str]:
+    # empreintes de tous les codes déjà vus pour ce site ; les lignes chargées
+    # avant l'ajout de la colonne fingerprint sont renvoyées telles quelles
     query = f"""
-    INSERT INTO `{bigquery_config.website_table!s}` (
-        website_id, website_name, website_name_clean, url
-    )
-    WITH t as (
-    SELECT
-        {result.website_id!r} website_id
-        , {result.website_name!r}
-        , {result.website_name_clean!r}
-        , {result.url!r}
-    )
-    SELECT * FROM t WHERE NOT EXISTS (
-        SELECT *
-        FROM `{bigquery_config.website_table!s}` w
-        WHERE w.website_id = t.website_id
+        SELECT DISTINCT
+            fingerprint,
+            IF(fingerprint IS NULL, code, NULL) AS code,
+            IF(fingerprint IS NULL, discount, NULL) AS discount,
+            IF(fingerprint IS NULL, description, NULL) AS description,
+            IF(fingerprint IS NULL, expiration_date, NULL) AS expiration_date
+        FROM `{bigquery_config.code_table!s}`
+        WHERE website_id = @website_id
+        """
+    with tracing.span("bigquery.query", operation="fingerprints"):
+        job = bigquery_config.client.query(
+            query, job_config=website_id_parameter(website_id)
+        )
+        rows = (
+            job.result()
+            .to_arrow(create_bqstorage_client=bigquery_config.use_storage_api)
+            .to_pandas(date_as_object=True)
+        )
+        tracing.record_bigquery_job(job)
+    legacy = rows["fingerprint"].isna()
+    return set(rows.loc[~legacy, "fingerprint"]) | set(
+        code_fingerprints(rows.loc[legacy])
     )
+
+
+def fingerprint_index(
+    url: str,
+    bigquery_config: BigQueryConfig,
+    cache: Optional[SnapshotCache] = None,
+) -> set[str]:
+    website_id = generate_hash_key_md5(url)
+    if cache is not None:
+        table_modified = table_last_modified(bigquery_config)
+        entry = cache.get_entry(website_id, table_modified)
+        if entry is not None and entry.get("has_fingerprints"):
+            fingerprints = cache.read_frame(website_id, "fingerprints")
+            if fingerprints is not None:
+                return set(fingerprints["fingerprint"])
+
+    fingerprints = query_fingerprints(website_id, bigquery_config)
+
+    if cache is not None and table_modified is not None:
+        cache.write(
+            website_id,
+            table_modified,
+            frames={"fingerprints": fingerprints_frame(fingerprints)},
+        )
+    return fingerprints
+
+
+def fingerprints_frame(fingerprints: Iterable[str]) -> pd.DataFrame:
+    return pd.DataFrame({"fingerprint": sorted(fingerprints)}, dtype="string")
+
+
+def download_previous_codes(
+    url: str,
+    bigquery_config: BigQueryConfig,
+    cache: Optional[SnapshotCache] = None,
+) -> pd.DataFrame:
+    return latest_execution_and_codes(url, bigquery_config, cache)[1]
+
+
+def merge_website_data(
+    results: Iterable[ScrapeResult], bigquery_config: BigQueryConfig
+) -> bigquery.QueryJob:
+    # insère ou met à jour toutes les lignes des sites en une seule requête
+    query = f"""
+    MERGE `{bigquery_config.website_table!s}` w
+    USING UNNEST(@websites) s
+    ON w.website_id = s.website_id
+    WHEN MATCHED THEN UPDATE SET
+        website_name = s.website_name,
+        website_name_clean = s.website_name_clean,
+        url = s.url
+    WHEN NOT MATCHED THEN INSERT (website_id, website_name, website_name_clean, url)
+    VALUES (s.website_id, s.website_name, s.website_name_clean, s.url)
     """
-    bigquery_config.client.query(query)
+    websites = {
+        result.website_id: bigquery.StructQueryParameter(
+            None,
+            bigquery.ScalarQueryParameter("website_id", "STRING", result.website_id),
+            bigquery.ScalarQueryParameter(
+                "website_name", "STRING", result.website_name
+            ),
+            bigquery.ScalarQueryParameter(
+                "website_name_clean", "STRING", result.website_name_clean
+            ),
+            bigquery.ScalarQueryParameter("url", "STRING", result.url),
+        )
+        for result in results
+    }
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ArrayQueryParameter("websites", "STRUCT", list(websites.values()))
+        ]
+    )
+    return bigquery_config.client.query(query, job_config=job_config)
 
 
-def upload_scrape_result(
-    result: ScrapeResult, bigquery_config: BigQueryConfig
-) -> None:
-    # vérifie que les tables existent
+def snapshot_frame(result: ScrapeResult) -> pd.DataFrame:
+    # même forme que le résultat de download_previous_codes
+    return result.codes_db_format[list(PREVIOUS_CODE_COLUMNS)]
+
+
+# tables dont l'existence a déjà été vérifiée par ce processus
+_existing_tables: set[str] = set()
+
+
+def ensure_tables_exist(bigquery_config: BigQueryConfig) -> None:
     for table in (bigquery_config.code_table, bigquery_config.website_table):
+        if str(table) in _existing_tables:
+            continue
         if not check_table_exists(table, bigquery_config.client):
             if bigquery_config.create_table_if_needed:
                 bigquery_config.client.create_table(table)
             else:
                 raise ValueError(f"Table '{table!s}' does not exist.")
+        _existing_tables.add(str(table))
+
+
+@functools.cache
+def arrow_types() -> dict[str, pa.DataType]:
+    return {
+        "STRING": pa.string(),
+        "INTEGER": pa.int64(),
+        "INT64": pa.int64(),
+        "FLOAT": pa.float64(),
+        "FLOAT64": pa.float64(),
+        "BOOLEAN": pa.bool_(),
+        "BOOL": pa.bool_(),
+        "DATE": pa.date32(),
+        "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+    }
+
+
+def arrow_schema(table: bigquery.Table) -> pa.Schema:
+    types = arrow_types()
+    return pa.schema(
+        [pa.field(field.name, types[field.field_type]) for field in table.schema]
+    )
+
 
-    # charge les données du site
-    upload_website_data(result=result, bigquery_config=bigquery_config)
+def codes_to_parquet(
+    results: Iterable[ScrapeResult], bigquery_config: BigQueryConfig
+) -> io.BytesIO:
+    import pyarrow.parquet as pq
 
-    # charge les données des codes
-    bigquery_config.client.load_table_from_dataframe(
-        dataframe=result.codes_db_format,
+    schema = arrow_schema(bigquery_config.code_table)
+    tables = [
+        pa.Table.from_pandas(
+            result.codes_db_format[schema.names], schema=schema, preserve_index=False
+        )
+        for result in results
+    ]
+    buffer = io.BytesIO()
+    pq.write_table(pa.concat_tables(tables), buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def load_codes(
+    results: Iterable[ScrapeResult], bigquery_config: BigQueryConfig
+) -> bigquery.LoadJob:
+    # charge les données des codes ; la colonne fingerprint est ajoutée aux
+    # tables créées avant son introduction
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        schema_update_options=[bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION],
+    )
+    return bigquery_config.client.load_table_from_file(
+        codes_to_parquet(results, bigquery_config),
         destination=bigquery_config.code_table,
+        job_config=job_config,
     )
+
+
+class BatchUploader:
+    # regroupe les résultats de plusieurs sites : une requête MERGE pour les sites
+    # et un seul job de chargement pour tous les codes
+    def __init__(
+        self,
+        bigquery_config: BigQueryConfig,
+        cache: Optional[SnapshotCache] = None,
+        client: Optional[bigquery.Client] = None,
+    ):
+        # client : remplace le client partagé de la configuration
+        if client is not None:
+            bigquery_config = bigquery_config.with_client(client)
+        self.bigquery_config = bigquery_config
+        self.cache = cache
+        self.results: list[ScrapeResult] = []
+
+    def add(self, result: ScrapeResult) -> None:
+        self.results.append(result)
+
+    def flush(self) -> None:
+        if not self.results:
+            return
+        results, self.results = self.results, []
+
+        ensure_tables_exist(self.bigquery_config)
+
+        # charge les données des sites
+        merge_job = merge_website_data(results, self.bigquery_config)
+
+        previous_table_modified = (
+            table_last_modified(self.bigquery_config)
+            if self.cache is not None
+            else None
+        )
+
+        load_job = load_codes(results, self.bigquery_config)
+        with tracing.span("bigquery.upload", n_sites=len(results)):
+            merge_job.result()
+            load_job.result()
+            tracing.record_bigquery_job(merge_job)
+
+        if self.cache is not None:
+            self.update_cache(results, previous_table_modified)
+
+    def update_cache(
+        self, results: list[ScrapeResult], previous_table_modified: Optional[str]
+    ) -> None:
+        # met à jour le cache une fois les données chargées. L'index des empreintes
+        # n'est complété que s'il était à jour avant l'écriture
+        fingerprints = {}
+        for result in results:
+            entry = self.cache.get_entry(result.website_id, previous_table_modified)
+            if entry is not None and entry.get("has_fingerprints"):
+                known = self.cache.read_frame(result.website_id, "fingerprints")
+                if known is not None:
+                    fingerprints[result.website_id] = set(known["fingerprint"])
+
+        table_modified = table_last_modified(self.bigquery_config)
+        for i, result in enumerate(results):
+            frames = {"codes": snapshot_frame(result)}
+            if result.website_id in fingerprints:
+                frames["fingerprints"] = fingerprints_frame(
+                    fingerprints[result.website_id]
+                    | set(result.codes_db_format["fingerprint"])
+                )
+            self.cache.write(
+                result.website_id,
+                table_modified,
+                frames=frames,
+                previous_table_modified=None if i else previous_table_modified,
+                last_execution=result.date.isoformat(),
+                has_fingerprints="fingerprints" in frames,
+            )
+
+
+def upload_scrape_result(
+    result: ScrapeResult,
+    bigquery_config: BigQueryConfig,
+    cache: Optional[SnapshotCache] = None,
+) -> None:
+    uploader = BatchUploader(bigquery_config, cache=cache)
+    uploader.add(result)
+    uploader.flush()
@@ -0,0 +1,92 @@
+import multiprocessing
+import time
+from dataclasses import dataclass, field
+from typing import Iterable
+from urllib.parse import urlparse
+
+from . import constants
+
+# indices des valeurs stockées pour chaque domaine
+_RATE, _TOKENS, _LAST_REFILL, _WAITED = range(4)
+
+
+def get_domain(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+@dataclass
+class RateLimiter:
+    # seau à jetons par domaine : le débit (requêtes/s) augmente tant que les
+    # réponses sont rapides et est divisé par `backoff` sur un échec ou une
+    # réponse lente
+    initial_rate: float = 1.0
+    min_rate: float = 0.05
+    max_rate: float = 4.0
+    burst: float = 1.0
+    increase: float = 1.25
+    backoff: float = 2.0
+    slow_threshold: float = 5.0
+    _buckets: dict = field(default_factory=dict, init=False, repr=False)
+
+    def register(self, urls: Iterable[str]) -> None:
+        # les seaux sont en mémoire partagée : ceux créés avant le lancement des
+        # processus sont communs à tous les workers
+        for url in urls:
+            self._bucket(get_domain(url))
+
+    def _bucket(self, domain: str):
+        if domain not in self._buckets:
+            context = multiprocessing.get_context(constants.WORKER_START_METHOD)
+            self._buckets[domain] = context.Array(
+                "d", [self.initial_rate, self.burst, time.monotonic(), 0.0]
+            )
+        return self._buckets[domain]
+
+    def wait(self, url: str) -> float:
+        bucket = self._bucket(get_domain(url))
+        with bucket.get_lock():
+            now = time.monotonic()
+            rate = bucket[_RATE]
+            tokens = min(
+                self.burst, bucket[_TOKENS] + (now - bucket[_LAST_REFILL]) * rate
+            )
+            # le jeton est réservé immédiatement (le solde peut devenir négatif)
+            # pour que les appels concurrents attendent leur tour
+            delay = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            bucket[_TOKENS] = tokens - 1
+            bucket[_LAST_REFILL] = now
+            bucket[_WAITED] += delay
+
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def _set_rate(self, url: str, factor: float) -> None:
+        bucket = self._bucket(get_domain(url))
+        with bucket.get_lock():
+            bucket[_RATE] = min(
+                self.max_rate, max(self.min_rate, bucket[_RATE] * factor)
+            )
+
+    def record_success(self, url: str, elapsed: float) -> None:
+        if elapsed > self.slow_threshold:
+            self._set_rate(url, 1 / self.backoff)
+        else:
+            self._set_rate(url, self.increase)
+
+    def record_failure(self, url: str) -> None:
+        self._set_rate(url, 1 / self.backoff)
+
+    def current_rate(self, url: str) -> float:
+        return self._bucket(get_domain(url))[_RATE]
+
+    def total_wait(self, url: str | None = None) -> float:
+        if url is not None:
+            return self._bucket(get_domain(url))[_WAITED]
+        return sum(bucket[_WAITED] for bucket in self._buckets.values())
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        return {
+            domain: {"rate": bucket[_RATE], "total_wait": bucket[_WAITED]}
+            for domain, bucket in self._buckets.items()
+        }
@@ -1,19 +1,31 @@
 import datetime
+import os
 import time
+from collections import Counter
 from dataclasses import dataclass, field
-from typing import Tuple, Union
+from typing import Iterable, Iterator, Tuple, Union
 
 import pandas as pd
+import requests
 from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.wait import WebDriverWait
 
-from scrape.codes import format_codes
-
-from . import constants
-from .driver import click_element, get_element, get_element_texts, get_elements
+from scrape.codes import card_fingerprints, code_fingerprints, format_codes
+
+from . import constants, extract, network, normalize, tracing
+from .checkpoint import RevealCheckpoint, card_keys
+from .driver import (
+    click_element,
+    get_card_texts,
+    get_element,
+    get_element_texts,
+    get_elements,
+    switch_to_window,
+)
+from .ratelimit import RateLimiter
 from .utils import generate_hash_key_md5
 
 # MONTH_FR_TO_EN = {
@@ -46,6 +58,11 @@ MONTH_FR_TO_EN = {
     "déc.": "december",
 }
 
+# "click" : on clique sur chaque bouton "voir le code"
+# "network" : on lit d'abord les codes dans les données de la page et les réponses
+# réseau (CDP), puis on clique uniquement pour les codes introuvables
+REVEAL_MODES = ("click", "network")
+
 CSS_SELECTORS = {
     "reject_cookies": "#cmpwelcomebtnno",
     "website_name": 'div[data-testid="header-widget"] h1',
@@ -61,6 +78,20 @@ CSS_SELECTORS = {
     "close_dialog": 'span[data-testid="CloseIcon"]',
 }
 
+CARD_CSS_SELECTOR = (
+    'div[data-testid="active-vouchers-widget"]'
+    ' div[data-testid="voucher-card-container"]'
+)
+
+# sélecteurs relatifs à CARD_CSS_SELECTOR
+CARD_FIELD_CSS_SELECTORS = {
+    "discount": ':scope div[data-testid="voucher-card-captions"]',
+    "description": ':scope div[data-testid="description-container"] h3',
+    "expiration_date": (
+        ":scope > div:first-of-type > div:last-of-type > div:last-of-type"
+    ),
+}
+
 FIELD_CSS_SELECTORS = {
     "discount": (
         'div[data-testid="active-vouchers-widget"]'
@@ -111,6 +142,41 @@ def format_exp_date(date_string: str):
     return date.date()
 
 
+def parse_field_texts(texts: dict[str, list[str]]) -> dict[str, list]:
+    # toutes les valeurs d'un champ sont converties en une fois
+    today = datetime.date.today()
+    data = {}
+    for field, values in texts.items():
+        if field == "discount":
+            values = normalize.parse_discounts(values).tolist()
+        if field == "expiration_date":
+            values = normalize.parse_expiration_dates(values, today=today).tolist()
+        data[field] = values
+    return data
+
+
+def scrape_metadata_http(
+    url: str, session: requests.Session | None = None
+) -> Tuple[str, dict[str, list]] | None:
+    # récupère les champs des cartes sans navigateur ; renvoie None si la page
+    # téléchargée ne contient pas les cartes (rendu côté client, blocage...)
+    return parse_metadata_html(extract.download_page(url, session=session))
+
+
+def parse_metadata_html(page: str | bytes) -> Tuple[str, dict[str, list]] | None:
+    tree = extract.parse_html(page)
+    website_name = extract.get_text(tree, CSS_SELECTORS["website_name"])
+    if website_name is None:
+        return None
+
+    texts = extract.extract_field_texts(tree, FIELD_CSS_SELECTORS)
+    lengths = {len(values) for values in texts.values()}
+    if len(lengths) != 1 or not lengths.pop():
+        return None
+
+    return parse_website_name(website_name), parse_field_texts(texts)
+
+
 def get_code_string(
     driver: Union[webdriver.Chrome, webdriver.Firefox],
     see_code_button: WebElement,
@@ -132,7 +198,7 @@ def get_code_string(
 
     new_window = driver.window_handles[0]
 
-    driver.switch_to.window(new_window)
+    switch_to_window(driver, new_window)
     code_str = get_element(driver, CSS_SELECTORS["code"]).text
 
     click_element(driver, CSS_SELECTORS["close_overlay"])
@@ -159,6 +225,7 @@ class ScrapeResult:
         codes = self.codes.copy()
         codes["scraping_date"] = self.date
         codes["website_id"] = self.website_id
+        codes["fingerprint"] = code_fingerprints(codes)
         return codes
 
     @property
@@ -166,93 +233,333 @@ class ScrapeResult:
         return format_codes(self.codes)
 
 
+@dataclass
+class CodeRecord:
+    # une carte et son code, produite par CodeScraper.iter_codes
+    url: str
+    website_name: str
+    position: int
+    discount: int
+    description: str
+    expiration_date: datetime.date | None
+    code: str
+
+
+def records_frame(records: Iterable[CodeRecord]) -> pd.DataFrame:
+    # même colonnes que ScrapeResult.codes
+    return pd.DataFrame(
+        [
+            {
+                "discount": record.discount,
+                "description": record.description,
+                "expiration_date": record.expiration_date,
+                "code": record.code,
+            }
+            for record in records
+        ],
+        columns=["discount", "description", "expiration_date", "code"],
+    )
+
+
 class CodeScraper:
-    def __init__(self, driver: Union[webdriver.Chrome, webdriver.Firefox], url: str):
+    def __init__(
+        self,
+        driver: Union[webdriver.Chrome, webdriver.Firefox],
+        url: str,
+        use_http: bool = False,
+        reveal_mode: str = "click",
+        rate_limiter: RateLimiter | None = None,
+        known_codes: dict[str, str] | None = None,
+        checkpoint_store=None,
+        export_dir: str | None = None,
+    ):
+        if reveal_mode not in REVEAL_MODES:
+            raise ValueError(f"Unknown reveal mode {reveal_mode!r}.")
         self.driver = driver
         self.url = url
+        self.use_http = use_http
+        self.reveal_mode = reveal_mode
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        # codes déjà connus, indexés par empreinte de carte (card_fingerprint)
+        self.known_codes = known_codes if known_codes is not None else {}
+        # point de reprise (LocalSnapshotStore ou GCSSnapshotStore), optionnel
+        self.checkpoint = (
+            RevealCheckpoint(checkpoint_store, url)
+            if checkpoint_store is not None
+            else None
+        )
+        # export local des codes au fil de leur révélation, optionnel
+        self.export_dir = export_dir
+        self.website_name: str | None = None
         self.data: dict = {}
+        self.n_codes: int | None = None
 
-    def scrape(self) -> ScrapeResult | None:
-        codes = []
+    def scrape_fields_http(self) -> bool:
+        try:
+            metadata = scrape_metadata_http(self.url)
+        except (requests.RequestException, ValueError, IndexError) as e:
+            print(f"HTTP extraction failed ({e!r}), falling back to the browser.")
+            return False
+        if metadata is None:
+            print("Voucher cards not found in the HTML, falling back to the browser.")
+            return False
+        self.website_name, self.data = metadata
+        return True
+
+    def scrape_fields(self) -> None:
+        cards = get_card_texts(self.driver, CARD_CSS_SELECTOR, CARD_FIELD_CSS_SELECTORS)
+        if all(value is not None for card in cards for value in card.values()):
+            texts = {
+                field: [card[field] for card in cards]
+                for field in CARD_FIELD_CSS_SELECTORS
+            }
+        else:
+            # structure inattendue : on revient à la lecture élément par élément
+            texts = {
+                field: get_element_texts(self.driver, css_selector)
+                for field, css_selector in FIELD_CSS_SELECTORS.items()
+            }
+        self.data = parse_field_texts(texts)
+
+    def reveal_code(self, i: int, first: bool) -> str:
         wait = WebDriverWait(self.driver, constants.TIMEOUT)
 
-        self.driver.get(self.url)
+        original_window = self.driver.current_window_handle
+        n_windows = len(self.driver.window_handles)
+
+        # l'onglet/le contexte change à chaque itération, on doit donc récupérer
+        # les éléments à nouveau
+        code_elements = get_elements(self.driver, CSS_SELECTORS["see_code"])
+        code_elements[i].click()
+        if first:
+            # pour le premier élément uniquement, on doit cliquer sur le bouton
+            # "voir le code" de la boîte de dialogue qui s'affiche dans l'onglet
+            # original
+            click_element(self.driver, css_selector=CSS_SELECTORS["see_code_dialog"])
+
+        # l'onglet original est redirigé vers le site du marchand, et un nouvel
+        # onglet s'ouvre pour afficher le code on attend que le nouvel onglet soit
+        # ouvert
+        wait.until(EC.number_of_windows_to_be(n_windows + 1))
+
+        # on ferme l'onglet original et on bascule sur le nouvel onglet
+        new_window = [
+            window
+            for window in self.driver.window_handles
+            if window != original_window
+        ][0]
+        self.driver.close()
+        switch_to_window(self.driver, new_window)
+
+        code_str = get_element(self.driver, css_selector=CSS_SELECTORS["code"]).text
+
+        click_element(self.driver, css_selector=CSS_SELECTORS["close_dialog"])
+
+        return code_str
+
+    def reuse_known_codes(self) -> list[str | None]:
+        # les cartes identiques de la page sont révélées par un clic, comme
+        # celles dont le titre est ambigu dans network.match_codes
+        fingerprints = card_fingerprints(self.data)
+        counts = Counter(fingerprints)
+        return [
+            self.known_codes.get(fingerprint) if counts[fingerprint] == 1 else None
+            for fingerprint in fingerprints
+        ]
+
+    def harvest_codes(self) -> list[str | None]:
+        try:
+            codes = network.harvest_codes(self.driver)
+        except WebDriverException as e:
+            print(f"Network capture failed ({e!r}).")
+            return [None] * len(self.data["description"])
+        return network.match_codes(self.data["description"], codes)
+
+    def resume_codes(self, codes: list[str | None]) -> list[str | None]:
+        try:
+            saved = self.checkpoint.load()
+        except Exception as e:
+            print(f"Could not read checkpoint ({e!r}).")
+            return codes
+        resumed = [
+            code if code is not None else saved.get(key)
+            for code, key in zip(codes, card_keys(card_fingerprints(self.data)))
+        ]
+        n_resumed = sum(code is None for code in codes) - resumed.count(None)
+        if n_resumed:
+            print(f"{n_resumed}/{len(codes)} code(s) restored from checkpoint.")
+        return resumed
+
+    def save_checkpoint(self, key: str, code: str, position: int) -> None:
+        # la sauvegarde de la progression ne doit pas interrompre le scraping
+        try:
+            self.checkpoint.save(key, code, position)
+        except Exception as e:
+            print(f"Could not save checkpoint ({e!r}).")
+
+    def build_result(self, codes: list[str]) -> ScrapeResult:
+        self.data["code"] = codes
+        current_codes = pd.DataFrame(self.data).sort_values("discount", ascending=False)
+        return ScrapeResult(self.url, self.website_name, current_codes)
+
+    def record(self, i: int, code: str) -> CodeRecord:
+        return CodeRecord(
+            url=self.url,
+            website_name=self.website_name,
+            position=i,
+            discount=self.data["discount"][i],
+            description=self.data["description"][i],
+            expiration_date=self.data["expiration_date"][i],
+            code=code,
+        )
+
+    def iter_codes(self) -> Iterator[CodeRecord]:
+        # produit chaque carte dès que son code est connu : d'abord les codes
+        # connus sans révélation, puis chaque code révélé
+        self.n_codes = None
+
+        # les champs des cartes sont lus dans le HTML brut si possible, le
+        # navigateur ne sert alors qu'à révéler les codes
+        fields_found = self.use_http and self.scrape_fields_http()
+
+        # si toutes les cartes sont déjà connues, le navigateur est inutile
+        if fields_found and self.known_codes:
+            codes = self.reuse_known_codes()
+            if all(code is not None for code in codes):
+                print(
+                    f"All {len(codes)} code(s) already known for "
+                    f"{self.website_name}, skipping the browser."
+                )
+                self.n_codes = len(codes)
+                for i, code in enumerate(codes):
+                    yield self.record(i, code)
+                return
+
+        if self.reveal_mode == "network":
+            network.enable_network_capture(self.driver)
+
+        with tracing.span("driver.get", url=self.url):
+            self.driver.get(self.url)
 
         try:
             click_element(self.driver, CSS_SELECTORS["reject_cookies"])
         except TimeoutException:
             pass
 
-        website_name = parse_website_name(
+        self.website_name = parse_website_name(
             get_element(self.driver, CSS_SELECTORS["website_name"]).text
         )
 
         try:
             click_element(self.driver, CSS_SELECTORS["display_codes_only"])
         except TimeoutException:
-            return None
-
-        for field, css_selector in FIELD_CSS_SELECTORS.items():
-            values = get_element_texts(self.driver, css_selector)
-            if field == "discount":
-                values = [int(value.split("%\n")[0]) for value in values]
-            if field == "expiration_date":
-                values = list(map(format_exp_date, values))
-            self.data[field] = values
+            return
 
         # scraping des codes
-        code_elements = get_elements(self.driver, CSS_SELECTORS["see_code"])
-        n_codes = len(code_elements)
-        print(f"{n_codes} code(s) found for {website_name}.")
-
-        for i in range(n_codes):
+        n_codes = len(get_elements(self.driver, CSS_SELECTORS["see_code"]))
+
+        # le HTML brut peut différer de la page rendue : dans ce cas on relit les
+        # champs dans le navigateur
+        if not fields_found or len(self.data["discount"]) != n_codes:
+            self.scrape_fields()
+
+        print(f"{n_codes} code(s) found for {self.website_name}.")
+
+        # les codes des cartes inchangées depuis la dernière exécution sont
+        # réutilisés sans être révélés à nouveau
+        codes = self.reuse_known_codes()
+        if self.known_codes:
+            print(
+                f"{sum(code is not None for code in codes)}/{n_codes} code(s) "
+                "already known."
+            )
+
+        # les codes présents dans les données de la page ou ses réponses réseau
+        # n'ont pas besoin d'être révélés
+        if self.reveal_mode == "network" and None in codes:
+            harvested = self.harvest_codes()
+            codes = [
+                code if code is not None else harvested_code
+                for code, harvested_code in zip(codes, harvested)
+            ]
+            print(
+                f"{sum(code is not None for code in harvested)}/{n_codes} code(s) "
+                "found in network data."
+            )
+
+        # reprise d'un scraping interrompu plus tôt dans la journée
+        if self.checkpoint is not None and None in codes:
+            codes = self.resume_codes(codes)
+        keys = card_keys(card_fingerprints(self.data))
+
+        self.n_codes = len(codes)
+        for i, code in enumerate(codes):
+            if code is not None:
+                yield self.record(i, code)
+
+        to_reveal = [i for i, code in enumerate(codes) if code is None]
+        for n, i in enumerate(to_reveal):
             print(f"Scraping code {i + 1}/{n_codes}...")
 
-            # on patiente 1 sec pour éviter de surcharger le serveur
-            time.sleep(1)
+            # on limite le débit pour éviter de surcharger le serveur
+            self.rate_limiter.wait(self.url)
+
+            start = time.perf_counter()
+            try:
+                with tracing.span("reveal_code", position=i):
+                    codes[i] = self.reveal_code(i, first=not n)
+            except TimeoutException:
+                self.rate_limiter.record_failure(self.url)
+                raise
+            self.rate_limiter.record_success(self.url, time.perf_counter() - start)
+            if self.checkpoint is not None:
+                self.save_checkpoint(keys[i], codes[i], i)
+            print("Done.")
+            yield self.record(i, codes[i])
 
-            original_window = self.driver.current_window_handle
-            n_windows = len(self.driver.window_handles)
+        if self.checkpoint is not None and self.checkpoint.entries:
+            try:
+                self.checkpoint.clear()
+            except Exception as e:
+                print(f"Could not clear checkpoint ({e!r}).")
 
-            if not i:
-                code_elements[i].click()
-                # pour le premier élément uniquement, on doit cliquer sur le bouton
-                # "voir le code" de la boîte de dialogue qui s'affiche dans l'onglet
-                # original
-                click_element(
-                    self.driver, css_selector=CSS_SELECTORS["see_code_dialog"]
-                )
-            else:
-                # l'onglet/le contexte change à chaque itération, on doit donc
-                # récupérer les éléments à nouveau
-                code_elements = get_elements(self.driver, CSS_SELECTORS["see_code"])
-                code_elements[i].click()
-
-            # l'onglet original est redirigé vers le site du marchand, et un nouvel
-            # onglet s'ouvre pour afficher le code on attend que le nouvel onglet soit
-            # ouvert
-            wait.until(EC.number_of_windows_to_be(n_windows + 1))
-
-            # on ferme l'onglet original et on bascule sur le nouvel onglet
-            new_window = [
-                window
-                for window in self.driver.window_handles
-                if window != original_window
-            ][0]
-            self.driver.close()
-            self.driver.switch_to.window(new_window)
-
-            code_str = get_element(self.driver, css_selector=CSS_SELECTORS["code"]).text
-            codes.append(code_str)
-            print("Done.")
+        print(
+            f"Rate limit: {self.rate_limiter.current_rate(self.url):.2f} req/s, "
+            f"{self.rate_limiter.total_wait(self.url):.1f} s spent waiting."
+        )
 
-            click_element(self.driver, css_selector=CSS_SELECTORS["close_dialog"])
+    def export_sinks(self) -> list:
+        from .sinks import ParquetSink
 
-        self.data["code"] = codes
+        if self.export_dir is None:
+            return []
+        os.makedirs(self.export_dir, exist_ok=True)
+        name = f"{datetime.date.today()}-{generate_hash_key_md5(self.url)}.parquet"
+        return [ParquetSink(os.path.join(self.export_dir, name))]
 
-        current_codes = pd.DataFrame(self.data).sort_values("discount", ascending=False)
+    def scrape(self) -> ScrapeResult | None:
+        codes = {}
+
+        def collect() -> Iterator[CodeRecord]:
+            for record in self.iter_codes():
+                codes[record.position] = record.code
+                yield record
 
-        return ScrapeResult(self.url, website_name, current_codes)
+        with tracing.span("scrape", url=self.url) as span:
+            sinks = self.export_sinks()
+            if sinks:
+                from .sinks import stream_to_sinks
+
+                # les cartes sont écrites par lots pendant la révélation des
+                # suivantes
+                stream_to_sinks(collect(), sinks)
+            else:
+                for _ in collect():
+                    pass
+            span.set(website_name=self.website_name, n_codes=self.n_codes)
+        if self.n_codes is None:
+            return None
+        return self.build_result([codes[i] for i in range(self.n_codes)])
 
     def close_driver(self):
         self.driver.quit()
@@ -1,12 +1,46 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
 
 from google.cloud import secretmanager
 
+from .cache import TTLCache, shared_client
 
-def get_secret_string(secret_name: str, project_id: str) -> str:
-    client = secretmanager.SecretManagerServiceClient()
+_secrets = TTLCache()
+
+
+def get_secret_client() -> secretmanager.SecretManagerServiceClient:
+    return shared_client("secretmanager", secretmanager.SecretManagerServiceClient)
+
+
+def _access_secret_string(secret_name: str, project_id: str) -> str:
     request = {
         "name": f"projects/{project_id}/secrets/{secret_name}/versions/latest"
     }
-    response = client.access_secret_version(request)
+    response = get_secret_client().access_secret_version(request)
     return response.payload.data.decode("UTF-8")
+
+
+def get_secret_string(secret_name: str, project_id: str) -> str:
+    return _secrets.get_or_set(
+        (project_id, secret_name),
+        lambda: _access_secret_string(secret_name, project_id),
+    )
+
+
+def get_secret_strings(
+    secret_names: Iterable[str], project_id: str
+) -> dict[str, str]:
+    # les secrets absents du cache sont récupérés en parallèle avec le même client
+    secret_names = list(secret_names)
+    missing = [
+        name for name in secret_names if _secrets.get((project_id, name)) is None
+    ]
+    if missing:
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            values = executor.map(
+                lambda name: _access_secret_string(name, project_id), missing
+            )
+            for name, value in zip(missing, values):
+                _secrets.set((project_id, name), value)
+    return {name: get_secret_string(name, project_id) for name in secret_names}
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Hashable, Iterable, Optional
+
+from .lazy import lazy_import
+from .utils import generate_hash_key_md5
+
+pd = lazy_import("pandas")
+
+# variables fixées par Cloud Run pour chaque tâche d'un job
+TASK_INDEX_ENV = "CLOUD_RUN_TASK_INDEX"
+TASK_COUNT_ENV = "CLOUD_RUN_TASK_COUNT"
+# nom de l'exécution, commun à ses tâches et à leurs relances
+EXECUTION_ENV = "CLOUD_RUN_EXECUTION"
+
+
+def shard_weight(website_id: str, index: int) -> int:
+    return int(generate_hash_key_md5(f"{website_id}:{index}"), 16)
+
+
+def shard_for(url: str, count: int) -> int:
+    # hachage de rendez-vous (HRW) : chaque site va à la tâche de plus grand
+    # poids. L'affectation d'un site ne dépend pas des autres sites, et passer
+    # de n à n + 1 tâches ne déplace qu'environ 1 / (n + 1) des sites
+    website_id = generate_hash_key_md5(url)
+    return max(range(count), key=lambda index: shard_weight(website_id, index))
+
+
+@dataclass(frozen=True)
+class Shard:
+    index: int = 0
+    count: int = 1
+    # les résultats des tâches sont rangés par exécution : une autre exécution
+    # du même jour (relance manuelle) ne lit pas ceux de la précédente
+    execution: str = ""
+
+    def __post_init__(self):
+        if self.count < 1 or not 0 <= self.index < self.count:
+            raise ValueError(f"Invalid shard {self.index} of {self.count}.")
+        if self.count > 1 and not self.execution:
+            raise ValueError(
+                f"Sharded runs need an execution name ({EXECUTION_ENV})."
+            )
+
+    @classmethod
+    def from_env(cls) -> "Shard":
+        return cls(
+            index=int(os.environ.get(TASK_INDEX_ENV, 0)),
+            count=int(os.environ.get(TASK_COUNT_ENV, 1)),
+            execution=os.environ.get(EXECUTION_ENV, ""),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 1
+
+    def owns(self, url: str) -> bool:
+        return shard_for(url, self.count) == self.index
+
+    def select(self, urls: list[str]) -> list[str]:
+        return [url for url in urls if self.owns(url)]
+
+
+class ShardResults:
+    # résultats de chaque tâche d'une exécution (tables des nouveaux codes, sites
+    # sans résultat), pour qu'une seule tâche envoie les alertes de tous les sites
+    def __init__(self, store, shard: Shard):
+        # store : LocalSnapshotStore ou GCSSnapshotStore
+        self.store = store
+        self.shard = shard
+
+    def name(self, index: int) -> str:
+        return f"{self.shard.execution}.shard-{index}-of-{self.shard.count}.json"
+
+    def load(self, index: int) -> Optional[dict]:
+        try:
+            return json.loads(self.store.read_bytes(self.name(index)))
+        except FileNotFoundError:
+            return None
+
+    def save(
+        self,
+        urls: list[str],
+        tables: dict[str, tuple[str, pd.DataFrame, Iterable[Hashable]]],
+        missing: list[str],
+        complete: bool = True,
+    ) -> None:
+        # complete=False : des sites ont échoué et la tâche sera relancée. La
+        # tâche relancée ne scrape que ces sites et complète les résultats déjà
+        # publiés
+        data = {
+            "urls": urls,
+            "tables": {url: table_to_json(*table) for url, table in tables.items()},
+            "missing": missing,
+            "complete": complete,
+        }
+        previous = self.load(self.shard.index)
+        if previous is not None:
+            data["urls"] = list(dict.fromkeys(previous["urls"] + urls))
+            data["tables"] = {**previous["tables"], **data["tables"]}
+            data["missing"] = [
+                url for url in previous["missing"] if url not in urls
+            ] + missing
+        self.store.write_bytes(self.name(self.shard.index), json.dumps(data).encode())
+
+    def load_all(self, partial: bool = False) -> Optional[list[dict]]:
+        # None tant qu'une tâche n'a pas terminé, sauf avec partial
+        results = []
+        for index in range(self.shard.count):
+            result = self.load(index)
+            if result is not None and (partial or result.get("complete", True)):
+                results.append(result)
+            elif not partial:
+                return None
+        return results
+
+    def claim_merge(self) -> bool:
+        # une seule tâche obtient le droit de fusionner, même si plusieurs
+        # terminent en même temps
+        name = f"{self.shard.execution}.merge-of-{self.shard.count}.lock"
+        return self.store.create_bytes(name, str(self.shard.index).encode())
+
+
+def table_to_json(
+    website_name: str, frame: pd.DataFrame, new_code_idxs: Iterable[Hashable]
+) -> dict:
+    # cellules converties en texte comme dans le rendu HTML, valeurs manquantes
+    # à null : la table fusionnée donne le même HTML que la table d'origine
+    return {
+        "website_name": website_name,
+        "columns": [str(column) for column in frame.columns],
+        "index": frame.index.tolist(),
+        "rows": [
+            [None if pd.isna(value) else str(value) for value in row]
+            for row in frame.itertuples(index=False, name=None)
+        ],
+        "new": pd.Index(new_code_idxs).tolist(),
+    }
+
+
+def table_from_json(data: dict) -> tuple[str, pd.DataFrame, list]:
+    frame = pd.DataFrame(data["rows"], columns=data["columns"], index=data["index"])
+    return data["website_name"], frame, data["new"]
+
+
+def merge_tables(results: list[dict]) -> dict[str, tuple[str, pd.DataFrame, list]]:
+    tables = {}
+    for result in results:
+        for url, table in result["tables"].items():
+            tables[url] = table_from_json(table)
+    return tables
@@ -0,0 +1,109 @@
+import abc
+import queue
+import threading
+import time
+from typing import Iterable, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .scraper import CodeRecord, records_frame
+
+BATCH_SIZE = 10
+FLUSH_INTERVAL = 30.0
+MAX_PENDING_BATCHES = 2
+
+
+class Sink(abc.ABC):
+    # reçoit les cartes par petits lots, dans un thread dédié
+    @abc.abstractmethod
+    def write(self, records: list[CodeRecord]) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class ParquetSink(Sink):
+    # un groupe de lignes par lot, dans un seul fichier
+    SCHEMA = pa.schema(
+        [
+            ("url", pa.string()),
+            ("discount", pa.int64()),
+            ("description", pa.string()),
+            ("expiration_date", pa.date32()),
+            ("code", pa.string()),
+        ]
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self.writer: Optional[pq.ParquetWriter] = None
+
+    def write(self, records: list[CodeRecord]) -> None:
+        frame = records_frame(records)
+        frame.insert(0, "url", [record.url for record in records])
+        table = pa.Table.from_pandas(frame, schema=self.SCHEMA, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, self.SCHEMA)
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+def stream_to_sinks(
+    records: Iterable[CodeRecord],
+    sinks: list[Sink],
+    batch_size: int = BATCH_SIZE,
+    flush_interval: float = FLUSH_INTERVAL,
+    max_pending: int = MAX_PENDING_BATCHES,
+) -> int:
+    # les lots sont écrits dans un thread pendant que le scraping continue. Un
+    # lot part dès qu'il est plein, ou à l'arrivée d'une carte si le lot en
+    # cours attend depuis flush_interval secondes. Au-delà de max_pending lots
+    # en attente, le producteur (ex. CodeScraper.iter_codes) est bloqué jusqu'à
+    # ce que les sinks rattrapent leur retard.
+    batches: queue.Queue = queue.Queue(maxsize=max_pending)
+    errors = []
+
+    def consume() -> None:
+        while (batch := batches.get()) is not None:
+            # après une erreur, les lots sont vidés sans être écrits pour ne pas
+            # bloquer le producteur
+            if errors:
+                continue
+            try:
+                for sink in sinks:
+                    sink.write(batch)
+            except Exception as e:
+                errors.append(e)
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    n_records = 0
+    batch, started = [], time.monotonic()
+    try:
+        for record in records:
+            if errors:
+                break
+            if not batch:
+                started = time.monotonic()
+            batch.append(record)
+            n_records += 1
+            if len(batch) >= batch_size or time.monotonic() - started >= flush_interval:
+                batches.put(batch)
+                batch = []
+    finally:
+        # le dernier lot est écrit même si le producteur a échoué : les codes
+        # déjà révélés ne sont pas perdus
+        if batch and not errors:
+            batches.put(batch)
+        batches.put(None)
+        consumer.join()
+        for sink in sinks:
+            sink.close()
+    if errors:
+        raise errors[0]
+    return n_records
@@ -0,0 +1,176 @@
+import functools
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+# SCRAPE_TRACE=traces.jsonl (ou "-" pour stderr) active le traçage : chaque
+# span terminé est écrit sur une ligne JSON, avec les champs d'un span
+# OpenTelemetry (trace_id, span_id, parent_span_id, start/end_time_unix_nano,
+# attributes). Désactivé, span() renvoie un objet inerte partagé.
+TRACE_ENV = "SCRAPE_TRACE"
+# identifiant de trace transmis aux processus enfants
+TRACE_ID_ENV = "SCRAPE_TRACE_ID"
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+# les spans enfants peuvent se terminer dans d'autres threads (asyncio.to_thread)
+_counters_lock = threading.Lock()
+_fd: Optional[int] = None
+_trace_id: Optional[str] = None
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "parent",
+        "span_id",
+        "attributes",
+        "counters",
+        "start",
+        "_token",
+    )
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: dict):
+        self.name = name
+        self.parent = parent
+        self.span_id = secrets.token_hex(8)
+        self.attributes = attributes
+        self.counters: dict[str, float] = {}
+        self.start = 0
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def count(self, name: str, value: float = 1) -> None:
+        with _counters_lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        end = time.time_ns()
+        _current.reset(self._token)
+        # les compteurs remontent vers le span parent
+        if self.parent is not None:
+            for name, value in self.counters.items():
+                self.parent.count(name, value)
+        _write(
+            {
+                "name": self.name,
+                "trace_id": _trace_id,
+                "span_id": self.span_id,
+                "parent_span_id": self.parent and self.parent.span_id,
+                "start_time_unix_nano": self.start,
+                "end_time_unix_nano": end,
+                "duration_ms": (end - self.start) / 1e6,
+                "status": "OK" if exc_type is None else "ERROR",
+                "error": None if exc is None else repr(exc),
+                "attributes": self.attributes,
+                "counters": self.counters,
+                "pid": os.getpid(),
+                "thread": threading.current_thread().name,
+            }
+        )
+
+
+class _NoopSpan:
+    def set(self, **attributes) -> None:
+        pass
+
+    def count(self, name: str, value: float = 1) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _write(record: dict) -> None:
+    # une seule écriture par ligne (O_APPEND) : les lignes des différents
+    # processus et threads ne se mélangent pas
+    if _fd is not None:
+        os.write(_fd, (json.dumps(record, default=str) + "\n").encode())
+
+
+def configure(path: Optional[str] = None) -> None:
+    # path : fichier JSON lines, "-" pour stderr, None pour désactiver
+    global _fd, _trace_id
+    if _fd is not None and _fd != sys.stderr.fileno():
+        os.close(_fd)
+    _fd = None
+    if not path:
+        return
+    if path == "-":
+        _fd = sys.stderr.fileno()
+    else:
+        _fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    _trace_id = os.environ.setdefault(TRACE_ID_ENV, secrets.token_hex(16))
+    os.environ[TRACE_ENV] = path
+
+
+def enabled() -> bool:
+    return _fd is not None
+
+
+def span(name: str, **attributes) -> Span | _NoopSpan:
+    if _fd is None:
+        return NOOP_SPAN
+    return Span(name, _current.get(), attributes)
+
+
+def count(name: str, value: float = 1) -> None:
+    if _fd is None:
+        return
+    current = _current.get()
+    if current is not None:
+        current.count(name, value)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    def decorator(function: Callable) -> Callable:
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _fd is None:
+                return function(*args, **kwargs)
+            with Span(span_name, _current.get(), {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_driver(driver: Any) -> None:
+    # compte les commandes WebDriver envoyées par le span courant
+    if _fd is None:
+        return
+    execute = driver.execute
+
+    def counting_execute(driver_command, params=None):
+        count("webdriver_commands")
+        return execute(driver_command, params)
+
+    driver.execute = counting_execute
+
+
+def record_bigquery_job(job: Any) -> None:
+    # octets lus et facturés par une requête terminée
+    count("bigquery_bytes_processed", getattr(job, "total_bytes_processed", 0) or 0)
+    count("bigquery_bytes_billed", getattr(job, "total_bytes_billed", 0) or 0)
+
+
+configure(os.environ.get(TRACE_ENV))
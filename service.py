@@ -0,0 +1,371 @@
+# Mode service : un processus qui tourne en continu, scrape chaque site selon
+# l'intervalle défini dans la configuration et garde navigateurs, clients et
+# caches chauds d'un job à l'autre.
+#
+# python service.py --port 8080 --workers 2
+#
+# GET  /status            état de chaque site et taille de la file
+# POST /trigger           met tous les sites en file
+# POST /trigger?url=...   met un site de la configuration en file, même s'il
+#                         n'est pas dû
+import argparse
+import datetime
+import json
+import queue
+import signal
+import threading
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from main import find_new_codes, previous_run, send_alerts
+from scrape.config import (
+    GoogleCloudConfig,
+    ScrapeConfig,
+    load_browser_config,
+    load_scrape_config_from_storage,
+    read_cloud_config,
+)
+from scrape.queries import (
+    BatchUploader,
+    LocalSnapshotStore,
+    create_snapshot_cache,
+    create_snapshot_store,
+    last_execution,
+)
+from scrape.utils import generate_hash_key_md5
+
+WATERMARK_DIR = "./.service"
+# délai avant de relancer un site dont le dernier job a échoué
+RETRY_DELAY = datetime.timedelta(minutes=15)
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class Watermarks:
+    # date du dernier scraping réussi de chaque site, persistée dans le même
+    # stockage que le cache des snapshots (ou en local) pour survivre aux
+    # redémarrages du service
+    NAME = "watermarks.json"
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        try:
+            self._values = json.loads(self.store.read_bytes(self.NAME))
+        except (FileNotFoundError, ValueError):
+            self._values = {}
+
+    def get(self, url: str) -> Optional[datetime.datetime]:
+        with self._lock:
+            value = self._values.get(generate_hash_key_md5(url))
+        return None if value is None else datetime.datetime.fromisoformat(value)
+
+    def set(self, url: str, value: datetime.datetime) -> None:
+        with self._lock:
+            self._values[generate_hash_key_md5(url)] = value.isoformat()
+            self.store.write_bytes(self.NAME, json.dumps(self._values).encode())
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return generate_hash_key_md5(url) in self._values
+
+
+@dataclass
+class SiteState:
+    status: str = "idle"
+    last_success: Optional[str] = None
+    last_error: Optional[str] = None
+    next_run: Optional[str] = None
+    runs: int = 0
+
+
+class ScrapeService:
+    def __init__(
+        self,
+        cloud_config: GoogleCloudConfig,
+        n_workers: int = 1,
+        tick_seconds: float = 60,
+    ):
+        # imports lourds (selenium) retardés comme dans main
+        from scrape.ratelimit import RateLimiter
+
+        self.cloud_config = cloud_config
+        self.n_workers = n_workers
+        self.tick_seconds = tick_seconds
+        # plusieurs workers chargent des résultats en même temps
+        self.cache = create_snapshot_cache(
+            cloud_config.snapshot_cache,
+            cloud_config.storage,
+            exclusive=n_workers == 1,
+        )
+        if self.cache is not None:
+            self.watermarks = Watermarks(self.cache.store)
+        else:
+            self.watermarks = Watermarks(LocalSnapshotStore(WATERMARK_DIR))
+        self.checkpoint_store = create_snapshot_store(
+            cloud_config.checkpoint, cloud_config.storage
+        )
+        self.rate_limiter = RateLimiter()
+        self.jobs: queue.Queue[str] = queue.Queue()
+        self.sites: dict[str, SiteState] = {}
+        self._seeded: set[str] = set()
+        self._retry_after: dict[str, datetime.datetime] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def scrape_config(self) -> ScrapeConfig:
+        # relue à chaque tour ; le blob n'est retéléchargé que s'il a changé
+        return load_scrape_config_from_storage(self.cloud_config.storage)
+
+    def seed_watermark(self, url: str) -> None:
+        # premier passage pour ce site : repart de la dernière exécution connue
+        # dans BigQuery pour ne pas rescraper un site déjà traité aujourd'hui
+        if url in self._seeded or url in self.watermarks:
+            return
+        last_exec_date = last_execution(
+            url=url, bigquery_config=self.cloud_config.bigquery, cache=self.cache
+        )
+        if last_exec_date is not None:
+            self.watermarks.set(
+                url,
+                datetime.datetime.combine(
+                    last_exec_date, datetime.time.min, datetime.timezone.utc
+                ),
+            )
+        self._seeded.add(url)
+
+    def enqueue(self, url: str) -> bool:
+        # un site déjà en file ou en cours n'est jamais lancé deux fois
+        with self._lock:
+            state = self.sites.setdefault(url, SiteState())
+            if state.status != "idle":
+                return False
+            state.status = "queued"
+        self.jobs.put(url)
+        return True
+
+    def schedule(self) -> None:
+        scrape_config = self.scrape_config
+        now = utcnow()
+        for url in scrape_config.urls:
+            try:
+                self.seed_watermark(url)
+            except Exception as e:
+                print(f"Could not read last execution for {url!r}: {e!r}")
+            last_success = self.watermarks.get(url)
+            next_run = (
+                now
+                if last_success is None
+                else last_success + scrape_config.interval(url)
+            )
+            with self._lock:
+                if url in self._retry_after:
+                    next_run = max(next_run, self._retry_after[url])
+                state = self.sites.setdefault(url, SiteState())
+                state.last_success = last_success and last_success.isoformat()
+                state.next_run = next_run.isoformat()
+            if next_run <= now and self.enqueue(url):
+                print(f"Scheduled {url!r}.")
+
+    def _scheduler(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.schedule()
+            except Exception as e:
+                print(f"Scheduling failed: {e!r}")
+            self._stop.wait(self.tick_seconds)
+
+    def run_job(self, url: str, driver_pool) -> None:
+        from scrape.scraper import CodeScraper
+
+        scrape_config = self.scrape_config
+        # la date de dernière exécution est suivie par les watermarks : seuls
+        # les codes connus (mode incrémental) sont utiles ici
+        known_codes = None
+        if scrape_config.incremental:
+            _, known_codes = previous_run(
+                url, scrape_config, self.cloud_config, self.cache
+            )
+        with driver_pool.session() as driver:
+            result = CodeScraper(
+                driver,
+                url,
+                use_http=scrape_config.use_http,
+                reveal_mode=scrape_config.reveal_mode,
+                rate_limiter=self.rate_limiter,
+                known_codes=known_codes,
+                checkpoint_store=self.checkpoint_store,
+                export_dir=scrape_config.export_dir,
+            ).scrape()
+        if result is None:
+            print(f"No codes found for {url!r}.")
+            return
+
+        new_codes = {
+            url: find_new_codes(result, scrape_config, self.cloud_config, self.cache)
+        }
+        uploader = BatchUploader(self.cloud_config.bigquery, cache=self.cache)
+        uploader.add(result)
+        uploader.flush()
+        send_alerts([result], new_codes, scrape_config, self.cloud_config)
+
+    def create_driver_pool(self):
+        from scrape.driver_pool import DriverPool
+
+        scrape_config = self.scrape_config
+        browser_config = load_browser_config(self.cloud_config.storage)
+        return DriverPool(
+            options=browser_config.options,
+            max_uses=scrape_config.driver_max_uses,
+            max_memory_mb=scrape_config.driver_max_memory_mb,
+            performance_log=scrape_config.reveal_mode == "network",
+            profile=browser_config.profile,
+        )
+
+    def _worker(self) -> None:
+        # un navigateur par worker, gardé ouvert entre les jobs. Sa
+        # configuration est relue jusqu'à ce qu'elle soit disponible : un worker
+        # arrêté laisserait les sites en file bloqués à l'état "queued"
+        driver_pool = None
+        try:
+            while not self._stop.is_set():
+                if driver_pool is None:
+                    try:
+                        driver_pool = self.create_driver_pool()
+                    except Exception as e:
+                        print(f"Could not start worker: {e!r}")
+                        self._stop.wait(self.tick_seconds)
+                        continue
+                try:
+                    url = self.jobs.get(timeout=1)
+                except queue.Empty:
+                    continue
+                self._run(url, driver_pool)
+        finally:
+            if driver_pool is not None:
+                driver_pool.close()
+
+    def _run(self, url: str, driver_pool) -> None:
+        with self._lock:
+            self.sites[url].status = "running"
+        started = utcnow()
+        try:
+            self.run_job(url, driver_pool)
+        except Exception as e:
+            print(f"Job failed for {url!r}: {e!r}")
+            with self._lock:
+                self.sites[url].last_error = repr(e)
+                self._retry_after[url] = utcnow() + RETRY_DELAY
+        else:
+            self.watermarks.set(url, started)
+            with self._lock:
+                self.sites[url].last_success = started.isoformat()
+                self.sites[url].last_error = None
+                self._retry_after.pop(url, None)
+        finally:
+            with self._lock:
+                self.sites[url].status = "idle"
+                self.sites[url].runs += 1
+            self.jobs.task_done()
+
+    def status(self) -> dict:
+        with self._lock:
+            sites = {url: asdict(state) for url, state in self.sites.items()}
+        return {"queue_size": self.jobs.qsize(), "sites": sites}
+
+    def trigger(self, url: Optional[str] = None) -> dict[str, bool]:
+        # seuls les sites de la configuration peuvent être lancés
+        urls = self.scrape_config.urls
+        if url is not None:
+            if url not in urls:
+                raise ValueError(f"{url!r} is not in the scrape configuration.")
+            urls = [url]
+        return {url: self.enqueue(url) for url in urls}
+
+    def start(self) -> None:
+        targets = [self._scheduler] + [self._worker] * self.n_workers
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        # les jobs en cours se terminent avant la fermeture des navigateurs
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+
+def create_handler(service: ScrapeService) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, status: int, data: dict) -> None:
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/status":
+                self.send_json(200, service.status())
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            parsed = urlparse(self.path)
+            if parsed.path != "/trigger":
+                self.send_json(404, {"error": "not found"})
+                return
+            url = parse_qs(parsed.query).get("url", [None])[0]
+            try:
+                queued = service.trigger(url)
+            except ValueError as e:
+                self.send_json(400, {"error": str(e)})
+                return
+            self.send_json(202, {"queued": queued})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="./cloud_config.json")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--tick", type=float, default=60)
+    args = parser.parse_args()
+
+    service = ScrapeService(
+        read_cloud_config(args.config), n_workers=args.workers, tick_seconds=args.tick
+    )
+    server = ThreadingHTTPServer((args.host, args.port), create_handler(service))
+    # SIGTERM (arrêt du conteneur) : arrêt propre du serveur puis des workers
+    signal.signal(
+        signal.SIGTERM,
+        lambda *args: threading.Thread(target=server.shutdown).start(),
+    )
+
+    service.start()
+    print(f"Listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import datetime
+import email
+import email.policy
+import socketserver
+import threading
+import unittest
+
+import pandas as pd
+
+from main import send_digests
+from scrape.codes import format_codes
+from scrape.config import ScrapeConfig
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    # serveur SMTP minimal : accepte tout et garde les messages reçus
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 localhost ready")
+        recipients = []
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 localhost")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip(" <>"))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while (data := self.rfile.readline()) not in (b".\r\n", b""):
+                    lines.append(data[1:] if data.startswith(b"..") else data)
+                message = email.message_from_bytes(
+                    b"".join(lines), policy=email.policy.default
+                )
+                self.server.messages.append((recipients, message))
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.messages = []
+
+
+def alert_table(website_name: str) -> tuple[str, pd.DataFrame, pd.Index]:
+    codes = pd.DataFrame(
+        {
+            "discount": [30, 10],
+            "description": [f"{website_name} offre 1", f"{website_name} offre 2"],
+            "expiration_date": [datetime.date(2030, 1, 1), None],
+            "code": [f"{website_name.upper()}30", f"{website_name.upper()}10"],
+        }
+    )
+    return website_name, format_codes(codes), codes.index[:1]
+
+
+class SendDigestsTest(unittest.TestCase):
+    def setUp(self):
+        self.server = SMTPServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def scrape_config(self, subscribers=None) -> ScrapeConfig:
+        return ScrapeConfig(
+            url=["https://fnac", "https://darty"],
+            send_alert=True,
+            min_discount=0,
+            subscribers=subscribers,
+            smtp_host="127.0.0.1",
+            smtp_port=self.server.server_address[1],
+            smtp_ssl=False,
+        )
+
+    def test_one_digest_per_subscriber(self):
+        tables = {
+            "https://fnac": alert_table("Fnac"),
+            "https://darty": alert_table("Darty"),
+        }
+        scrape_config = self.scrape_config(
+            {
+                "alice@example.com": ["https://fnac", "https://darty"],
+                "bob@example.com": ["https://darty"],
+                "carol@example.com": ["https://boulanger"],
+            }
+        )
+        send_digests(
+            tables, scrape_config, None, credentials=("alerts@example.com", None)
+        )
+
+        received = {
+            recipients[0]: message for recipients, message in self.server.messages
+        }
+        self.assertEqual(set(received), {"alice@example.com", "bob@example.com"})
+        alice = received["alice@example.com"].get_content()
+        self.assertIn("<h3>Fnac</h3>", alice)
+        self.assertIn("<h3>Darty</h3>", alice)
+        bob = received["bob@example.com"].get_content()
+        self.assertIn("DARTY30", bob)
+        self.assertNotIn("FNAC30", bob)
+        self.assertEqual(received["bob@example.com"]["From"], "alerts@example.com")
+
+    def test_sender_receives_all_sites_by_default(self):
+        tables = {"https://fnac": alert_table("Fnac")}
+        send_digests(
+            tables,
+            self.scrape_config(),
+            None,
+            credentials=("alerts@example.com", None),
+        )
+        [(recipients, message)] = self.server.messages
+        self.assertEqual(recipients, ["alerts@example.com"])
+        self.assertIn("FNAC30", message.get_content())
+
+    def test_nothing_sent_without_tables(self):
+        send_digests({}, self.scrape_config(), None, credentials=("a@b.c", None))
+        self.assertEqual(self.server.messages, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import datetime
+import unittest
+
+import pandas as pd
+
+from scrape.codes import card_fingerprints, known_codes_from_previous
+
+
+class KnownCodesFromPreviousTest(unittest.TestCase):
+    def test_identical_cards_are_not_reused(self):
+        previous_codes = pd.DataFrame(
+            {
+                "discount": [10, 10, 20],
+                "description": ["10% sur tout", "10% sur tout", "20% sur tout"],
+                "expiration_date": [datetime.date(2030, 1, 1)] * 3,
+                "code": ["AAA", "BBB", "CCC"],
+            }
+        )
+        fingerprints = card_fingerprints(previous_codes)
+        self.assertEqual(
+            known_codes_from_previous(previous_codes), {fingerprints[2]: "CCC"}
+        )
+
+    def test_no_previous_codes(self):
+        self.assertEqual(known_codes_from_previous(pd.DataFrame()), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
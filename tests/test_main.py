@@ -0,0 +1,78 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+import main
+from scrape.config import BrowserConfig, ScrapeConfig
+from scrape.sharding import TASK_COUNT_ENV, TASK_INDEX_ENV
+
+URL = "https://www.radins.com/code-promo/fnac"
+
+
+class EarlyExitTest(unittest.TestCase):
+    def test_does_not_wait_for_browsers(self):
+        from scrape.pool import ScrapePool
+
+        def create_scrape_pool(scrape_config, browser_config, cloud_config):
+            pool = ScrapePool(scrape_config.urls, options=[], n_workers=1)
+            # un navigateur qui met longtemps à démarrer
+            pool.start_warm_up = lambda: [pool.executor.submit(time.sleep, 10)]
+            return pool
+
+        async def gather_checks(scrape_config, cloud_config, cache):
+            # le site a déjà été scrapé aujourd'hui
+            await asyncio.sleep(1)
+            return [], {}
+
+        scrape_config = ScrapeConfig(url=[URL], send_alert=False, min_discount=0)
+        with mock.patch.multiple(
+            main,
+            load_scrape_config_from_storage=mock.Mock(return_value=scrape_config),
+            load_browser_config=mock.Mock(return_value=BrowserConfig(options=[])),
+            create_snapshot_cache=mock.Mock(return_value=None),
+            create_scrape_pool=create_scrape_pool,
+            gather_checks=gather_checks,
+        ), mock.patch.dict("os.environ", {TASK_INDEX_ENV: "0", TASK_COUNT_ENV: "1"}):
+            start = time.perf_counter()
+            asyncio.run(main.orchestrate())
+            elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 5)
+
+
+class FailedSitePool:
+    # pool dont l'unique site échoue en cours de révélation des codes
+    failed = []
+
+    def start_warm_up(self):
+        return []
+
+    def scrape(self, urls, known_codes):
+        self.failed = list(urls)
+        return []
+
+    def close(self, cancel=False):
+        pass
+
+
+class FailedSiteTest(unittest.TestCase):
+    def test_exits_with_an_error(self):
+        async def gather_checks(scrape_config, cloud_config, cache):
+            return scrape_config.urls, {}
+
+        scrape_config = ScrapeConfig(url=[URL], send_alert=False, min_discount=0)
+        with mock.patch.multiple(
+            main,
+            load_scrape_config_from_storage=mock.Mock(return_value=scrape_config),
+            load_browser_config=mock.Mock(return_value=BrowserConfig(options=[])),
+            create_snapshot_cache=mock.Mock(return_value=None),
+            create_scrape_pool=mock.Mock(return_value=FailedSitePool()),
+            gather_checks=gather_checks,
+            load_known_fingerprints=mock.Mock(return_value=set()),
+        ), mock.patch.dict("os.environ", {TASK_INDEX_ENV: "0", TASK_COUNT_ENV: "1"}):
+            with self.assertRaisesRegex(RuntimeError, "Scraping failed for 1 site"):
+                asyncio.run(main.orchestrate())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import datetime
+import pathlib
+import tempfile
+import unittest
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from scrape.config import read_cloud_config
+from scrape.queries import BatchUploader, LocalSnapshotStore, SnapshotCache
+from scrape.scraper import ScrapeResult
+
+CLOUD_CONFIG = pathlib.Path(__file__).parents[1] / "cloud_config.json"
+
+
+class FakeJob:
+    def result(self):
+        return self
+
+
+class FakeTable:
+    def __init__(self, modified: datetime.datetime):
+        self.modified = modified
+
+
+class FakeBigQueryClient:
+    # enregistre les requêtes et lit les fichiers chargés au lieu de les envoyer
+    def __init__(self):
+        self.queries = []
+        self.loads = []
+        self.modified = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def get_table(self, table):
+        return FakeTable(self.modified)
+
+    def query(self, query, job_config=None):
+        self.queries.append((query, job_config))
+        return FakeJob()
+
+    def load_table_from_file(self, file, destination, job_config=None):
+        self.loads.append((pq.read_table(file).to_pandas(), destination))
+        self.modified += datetime.timedelta(minutes=1)
+        return FakeJob()
+
+
+def scrape_result(url: str, website_name: str, n_codes: int) -> ScrapeResult:
+    codes = pd.DataFrame(
+        {
+            "discount": [10 * (i + 1) for i in range(n_codes)],
+            "description": [f"{website_name} offre {i}" for i in range(n_codes)],
+            "expiration_date": [datetime.date(2030, 1, 1)] * n_codes,
+            "code": [f"{website_name.upper()}{i}" for i in range(n_codes)],
+        }
+    )
+    return ScrapeResult(url, website_name, codes)
+
+
+class BatchUploaderTest(unittest.TestCase):
+    def setUp(self):
+        self.bigquery_config = read_cloud_config(CLOUD_CONFIG).bigquery
+        self.client = FakeBigQueryClient()
+        self.results = [
+            scrape_result("https://www.radins.com/code-promo/fnac", "Fnac", 2),
+            scrape_result("https://www.radins.com/code-promo/darty", "Darty", 3),
+        ]
+
+    def test_one_merge_and_one_load_for_all_sites(self):
+        uploader = BatchUploader(self.bigquery_config, client=self.client)
+        for result in self.results:
+            uploader.add(result)
+        uploader.flush()
+
+        self.assertEqual(len(self.client.queries), 1)
+        query, job_config = self.client.queries[0]
+        self.assertIn("MERGE", query)
+        self.assertEqual(len(job_config.query_parameters[0].values), 2)
+
+        self.assertEqual(len(self.client.loads), 1)
+        codes, destination = self.client.loads[0]
+        self.assertEqual(str(destination), str(self.bigquery_config.code_table))
+        self.assertEqual(len(codes), 5)
+        self.assertEqual(
+            set(codes["website_id"]), {result.website_id for result in self.results}
+        )
+        self.assertTrue(codes["fingerprint"].notna().all())
+
+        # le lot est vidé après l'envoi
+        uploader.flush()
+        self.assertEqual(len(self.client.loads), 1)
+
+    def test_cache_updated_after_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = SnapshotCache(LocalSnapshotStore(directory))
+            uploader = BatchUploader(
+                self.bigquery_config, cache=cache, client=self.client
+            )
+            for result in self.results:
+                uploader.add(result)
+            uploader.flush()
+
+            table_modified = self.client.modified.isoformat()
+            for result in self.results:
+                entry = cache.get_entry(result.website_id, table_modified)
+                self.assertEqual(entry["last_execution"], result.date.isoformat())
+                codes = cache.read_frame(result.website_id, "codes")
+                self.assertEqual(sorted(codes["code"]), sorted(result.codes["code"]))
+
+    def test_shared_client_untouched(self):
+        uploader = BatchUploader(self.bigquery_config, client=self.client)
+        self.assertIs(uploader.bigquery_config.client, self.client)
+        self.assertIsNone(self.bigquery_config._client)
+
+
+if __name__ == "__main__":
+    unittest.main()
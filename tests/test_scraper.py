@@ -0,0 +1,97 @@
+import datetime
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from scrape.checkpoint import card_keys
+from scrape.codes import card_fingerprints
+from scrape.queries import LocalSnapshotStore
+from scrape.scraper import CodeScraper, format_exp_date, parse_metadata_html
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures"
+MERCHANT_PAGE = FIXTURES / "merchant_page.html"
+
+
+class ParseMetadataHtmlTest(unittest.TestCase):
+    def test_merchant_page(self):
+        website_name, data = parse_metadata_html(MERCHANT_PAGE.read_bytes())
+        today = datetime.date.today()
+        self.assertEqual(website_name, "Fnac")
+        self.assertEqual(data["discount"], [20, 5, 0])
+        self.assertEqual(
+            data["description"],
+            [
+                "20% sur les livres numériques",
+                "5% pour les adhérents",
+                "Livraison gratuite dès 25€",
+            ],
+        )
+        self.assertEqual(
+            data["expiration_date"],
+            [
+                format_exp_date("Expire le : 12 déc."),
+                today,
+                today + datetime.timedelta(days=1),
+            ],
+        )
+
+    def test_page_without_cards(self):
+        page = MERCHANT_PAGE.read_text().replace("voucher-card-container", "other")
+        self.assertIsNone(parse_metadata_html(page))
+
+
+class ReuseKnownCodesTest(unittest.TestCase):
+    def test_identical_cards_are_revealed(self):
+        _, data = parse_metadata_html(MERCHANT_PAGE.read_bytes())
+        # la première carte apparaît deux fois sur la page
+        data = {column: [values[0], *values] for column, values in data.items()}
+        fingerprints = card_fingerprints(data)
+        known_codes = {fingerprints[0]: "AAA", fingerprints[2]: "BBB"}
+        scraper = CodeScraper(None, MERCHANT_PAGE.as_uri(), known_codes=known_codes)
+        scraper.data = data
+        self.assertEqual(scraper.reuse_known_codes(), [None, None, "BBB", None])
+
+
+class ResumeCodesTest(unittest.TestCase):
+    def test_identical_cards_keep_their_own_code(self):
+        _, data = parse_metadata_html(MERCHANT_PAGE.read_bytes())
+        data = {column: [values[0], *values] for column, values in data.items()}
+        keys = card_keys(card_fingerprints(data))
+        with tempfile.TemporaryDirectory() as directory:
+            store = LocalSnapshotStore(directory)
+            # première exécution interrompue après les deux cartes identiques
+            scraper = CodeScraper(None, MERCHANT_PAGE.as_uri(), checkpoint_store=store)
+            scraper.save_checkpoint(keys[0], "AAA", 0)
+            scraper.save_checkpoint(keys[1], "BBB", 1)
+
+            scraper = CodeScraper(None, MERCHANT_PAGE.as_uri(), checkpoint_store=store)
+            scraper.data = data
+            self.assertEqual(
+                scraper.resume_codes([None] * 4), ["AAA", "BBB", None, None]
+            )
+
+
+CHROME = shutil.which("google-chrome") or shutil.which("chromium")
+
+
+@unittest.skipUnless(CHROME, "Chrome is not installed")
+class SeleniumParityTest(unittest.TestCase):
+    def test_same_fields_as_selenium(self):
+        from scrape.driver import init_driver
+
+        driver = init_driver(options=("--headless=new", "--no-sandbox"))
+        try:
+            driver.get(MERCHANT_PAGE.as_uri())
+            scraper = CodeScraper(driver, MERCHANT_PAGE.as_uri())
+            scraper.scrape_fields()
+        finally:
+            driver.quit()
+        # les deux chemins doivent donner les mêmes champs (et donc les mêmes
+        # empreintes de cartes)
+        _, data = parse_metadata_html(MERCHANT_PAGE.read_bytes())
+        self.assertEqual(scraper.data, data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import dataclasses
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import service
+from scrape.config import BrowserConfig, ScrapeConfig, read_cloud_config
+
+from .test_queries import CLOUD_CONFIG
+
+URL = "https://www.radins.com/code-promo/fnac"
+
+
+class ServiceWorkerTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cloud_config = dataclasses.replace(
+            read_cloud_config(CLOUD_CONFIG), snapshot_cache=None, checkpoint=None
+        )
+        with mock.patch.object(service, "WATERMARK_DIR", directory.name):
+            self.service = service.ScrapeService(cloud_config, tick_seconds=0.01)
+        scrape_config = ScrapeConfig(url=[URL], send_alert=False, min_discount=0)
+        patcher = mock.patch.object(
+            service, "load_scrape_config_from_storage", return_value=scrape_config
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_worker_survives_failed_start(self):
+        # la configuration du navigateur est indisponible au premier essai
+        browser_configs = mock.Mock(
+            side_effect=[OSError("GCS unavailable"), BrowserConfig(options=[])]
+        )
+        done = threading.Event()
+
+        def run_job(url, driver_pool):
+            done.set()
+
+        with mock.patch.object(service, "load_browser_config", browser_configs):
+            with mock.patch.object(self.service, "run_job", side_effect=run_job):
+                self.assertTrue(self.service.enqueue(URL))
+                # seul le worker est lancé, sans le planificateur
+                worker = threading.Thread(target=self.service._worker, daemon=True)
+                worker.start()
+                self.service._threads.append(worker)
+                try:
+                    self.assertTrue(done.wait(5))
+                finally:
+                    self.service.stop()
+
+        self.assertEqual(browser_configs.call_count, 2)
+        self.assertEqual(self.service.sites[URL].status, "idle")
+        self.assertEqual(self.service.sites[URL].runs, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
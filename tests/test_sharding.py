@@ -0,0 +1,66 @@
+import tempfile
+import unittest
+
+from scrape.queries import LocalSnapshotStore
+from scrape.sharding import Shard, ShardResults
+
+from .test_alert import alert_table
+
+
+class ShardResultsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = LocalSnapshotStore(directory.name)
+
+    def results(self, index: int, execution: str = "job-1") -> ShardResults:
+        return ShardResults(self.store, Shard(index, 2, execution))
+
+    def test_retried_shard_completes_its_results(self):
+        self.results(1).save(["https://darty"], {}, ["https://darty"])
+        # la tâche 0 échoue sur un site : la fusion attend sa relance
+        self.results(0).save(
+            ["https://fnac", "https://boulanger"],
+            {"https://fnac": alert_table("Fnac")},
+            ["https://boulanger"],
+            complete=False,
+        )
+        self.assertIsNone(self.results(1).load_all())
+        self.assertEqual(len(self.results(1).load_all(partial=True)), 2)
+
+        # la relance ne scrape que le site en échec
+        self.results(0).save(
+            ["https://boulanger"], {"https://boulanger": alert_table("Boulanger")}, []
+        )
+        shard_0, shard_1 = self.results(1).load_all()
+        self.assertEqual(shard_0["urls"], ["https://fnac", "https://boulanger"])
+        self.assertEqual(set(shard_0["tables"]), {"https://fnac", "https://boulanger"})
+        self.assertEqual(shard_0["missing"], [])
+        self.assertEqual(shard_1["missing"], ["https://darty"])
+
+    def test_executions_are_independent(self):
+        # une première exécution du jour publie et fusionne ses résultats
+        for index in range(2):
+            self.results(index).save([f"https://site-{index}"], {}, [])
+        self.assertTrue(self.results(1).claim_merge())
+
+        # une deuxième exécution le même jour ne voit pas ces résultats
+        second = self.results(0, execution="job-2")
+        second.save(["https://site-0"], {}, [])
+        self.assertIsNone(second.load_all())
+        self.results(1, execution="job-2").save(["https://site-1"], {}, [])
+        self.assertEqual(
+            [shard["urls"] for shard in second.load_all()],
+            [["https://site-0"], ["https://site-1"]],
+        )
+        self.assertTrue(second.claim_merge())
+        self.assertFalse(self.results(1, execution="job-2").claim_merge())
+
+    def test_sharded_run_needs_an_execution(self):
+        with self.assertRaises(ValueError):
+            Shard(0, 2)
+        self.assertFalse(Shard().enabled)
+
+
+if __name__ == "__main__":
+    unittest.main()
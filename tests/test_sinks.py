@@ -0,0 +1,76 @@
+import datetime
+import pathlib
+import tempfile
+import unittest
+
+import pyarrow.parquet as pq
+
+from scrape.scraper import CodeRecord
+from scrape.sinks import ParquetSink, Sink, stream_to_sinks
+
+
+def code_records(url: str, website_name: str, n_codes: int) -> list[CodeRecord]:
+    return [
+        CodeRecord(
+            url=url,
+            website_name=website_name,
+            position=i,
+            discount=10 * (i + 1),
+            description=f"{website_name} offre {i}",
+            expiration_date=datetime.date(2030, 1, 1),
+            code=f"{website_name.upper()}{i}",
+        )
+        for i in range(n_codes)
+    ]
+
+
+def interrupted(records: list[CodeRecord], after: int):
+    # flux coupé en cours de route, comme un scraping qui échoue
+    for i, record in enumerate(records):
+        if i == after:
+            raise TimeoutError("reveal timed out")
+        yield record
+
+
+class RecordingSink(Sink):
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+
+    def write(self, records: list[CodeRecord]) -> None:
+        self.batches.append([record.code for record in records])
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class StreamToSinksTest(unittest.TestCase):
+    def setUp(self):
+        self.records = code_records("https://www.radins.com/code-promo/fnac", "Fnac", 5)
+
+    def test_records_written_in_batches(self):
+        sink = RecordingSink()
+        n_records = stream_to_sinks(self.records, [sink], batch_size=2)
+        self.assertEqual(n_records, 5)
+        self.assertEqual(
+            sink.batches, [["FNAC0", "FNAC1"], ["FNAC2", "FNAC3"], ["FNAC4"]]
+        )
+        self.assertTrue(sink.closed)
+
+    def test_parquet_keeps_written_batches(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = pathlib.Path(directory) / "codes.parquet"
+            with self.assertRaises(TimeoutError):
+                stream_to_sinks(
+                    interrupted(self.records, 3), [ParquetSink(str(path))], batch_size=2
+                )
+            codes = pq.read_table(path).to_pandas()
+            self.assertEqual(list(codes["code"]), ["FNAC0", "FNAC1", "FNAC2"])
+
+    def test_sink_requires_write(self):
+        with self.assertRaises(TypeError):
+            Sink()
+
+
+if __name__ == "__main__":
+    unittest.main()